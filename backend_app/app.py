@@ -1,35 +1,420 @@
-from flask import Flask, request, jsonify
+import hmac
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+_import_start = time.perf_counter()
+
+import thread_budget  # ahead of numpy, which `python app.py` would otherwise load with default pools
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
-import librosa
+from flask_sock import Sock
+from werkzeug.exceptions import RequestEntityTooLarge
 import numpy as np
 
 # Import your existing functions and classes here
-from script import process_audio_pipeline
+from script import (RESULT_THRESHOLD, PROCESSING_TIERS, DEFAULT_TIER, MEDIAN_LENGTH, process_audio_pipeline,
+                    preload_modules, audio_duration, timed_stage, warm_up)
+from streaming import StreamingSession
+from tiers import TierSelector
+from profiling import RequestProfiler
+from noise_profiles import NoiseProfileStore
+from model_registry import ModelRegistry
+from features import FEATURE_CONFIG, FEATURE_DTYPES, decode_features, max_payload_size
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests (from Flutter)
+sock = Sock(app)
+
+# Sample formats accepted on the streaming endpoint
+STREAM_SAMPLE_FORMATS = {'float32': '<f4', 'int16': '<i2'}
+# A stream holds one of the worker's request threads, so it is closed when
+# the client goes silent for STREAM_RECEIVE_TIMEOUT seconds or sends more
+# audio than the analysis window plus STREAM_MARGIN_SECONDS (leading silence
+# is trimmed off before the window starts)
+STREAM_RECEIVE_TIMEOUT = float(os.environ.get('STREAM_RECEIVE_TIMEOUT', 10))
+STREAM_MAX_SECONDS = MEDIAN_LENGTH + float(os.environ.get('STREAM_MARGIN_SECONDS', 30))
+STREAM_MAX_SAMPLE_RATE = 192000
+# Largest WebSocket message accepted, a few seconds of audio at the highest rate
+app.config['SOCK_SERVER_OPTIONS'] = {'max_message_size': 4 * 2 ** 20}
+
+# Per-request peak memory tracking with tracemalloc, off unless MEMORY_TRACKING=1.
+# Tracing slows every allocation, so it only starts once the warm-up is done.
+MEMORY_TRACKING = os.environ.get('MEMORY_TRACKING', '0') == '1'
+
+# Startup timings (in seconds), reported by /readyz and printed to the log
+startup_timings = {'app_import': time.perf_counter() - _import_start}
+ready = threading.Event()
+_first_request_lock = threading.Lock()
+tier_selector = TierSelector()
+profiler = RequestProfiler()
+noise_profiles = NoiseProfileStore()
+# Primary model and shadow candidates (PRIMARY_MODEL, SHADOW_MODELS)
+model_registry = ModelRegistry()
+
+# Length of the synthetic recording timed to seed each tier's latency estimate
+CALIBRATION_SECONDS = 10.0
+
+# Token required by the admin endpoints and the X-Profile header; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+
+def warm_up_backend():
+    """
+    Import the heavy modules, load the models, push one synthetic request
+    through the pipeline and time every tier, then mark the backend as ready
+    to serve traffic. The tiers are timed before any request is accepted, so
+    the calibration runs neither slow down live traffic nor are skewed by it.
+    """
+    try:
+        print(f"Thread budget: {thread_budget.settings()}")
+        start = time.perf_counter()
+        startup_timings['imports'] = preload_modules()
+        startup_timings['import_total'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model_registry.load()
+        startup_timings['model_load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        warm_up(tflite_model_path=model_registry.primary_path)
+        startup_timings['warm_up'] = time.perf_counter() - start
+
+        # Warm up the cheaper tiers too, then seed every tier's latency estimate
+        # from a second, already warm run, so it excludes first-call costs
+        start = time.perf_counter()
+        for tier in PROCESSING_TIERS:
+            if tier != DEFAULT_TIER:
+                warm_up(tflite_model_path=model_registry.primary_path, tier=tier)
+            stats = {}
+            warm_up(CALIBRATION_SECONDS, tflite_model_path=model_registry.primary_path, tier=tier, stats=stats)
+            tier_selector.observe(tier, stats['timings'], CALIBRATION_SECONDS)
+        startup_timings['tier_calibration'] = time.perf_counter() - start
+
+        if MEMORY_TRACKING:
+            tracemalloc.start()
+        ready.set()
+        print(f"Backend ready, startup timings: {startup_timings}")
+    except Exception as e:
+        startup_timings['error'] = str(e)
+        print(f"Warm-up failed: {e}")
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving HTTP
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: only accept traffic once the warm-up request has completed
+    if not ready.is_set():
+        return jsonify({'status': 'warming up', 'timings': startup_timings}), 503
+    return jsonify({'status': 'ready', 'timings': startup_timings})
+
+
+def is_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def requested_profiler():
+    """
+    Profiler asked for with the X-Profile header ('cprofile', 'sampling', or
+    '1' for the default), honoured for admins only.
+    """
+    kind = request.headers.get('X-Profile')
+    if not kind or not is_admin():
+        return None
+    return profiler.default_kind if kind.lower() in ('1', 'true') else kind
+
+
+def parse_latency_budget(milliseconds):
+    """
+    :param milliseconds: str or None, the latency budget given by the client
+    :return: float, the budget in seconds, or None if not given or not a positive finite number
+    """
+    try:
+        budget = float(milliseconds) / 1000
+    except (TypeError, ValueError):
+        return None
+    return budget if math.isfinite(budget) and budget > 0 else None
+
 
 @app.route('/process-audio', methods=['POST'])
 def process_audio():
     try:
-        # Access the uploaded file
+        start = time.perf_counter()
+
+        # The client may ask for a DSP quality tier or give a latency budget
+        requested_tier = request.form.get('tier') or request.headers.get('X-Processing-Tier')
+        if requested_tier and requested_tier not in PROCESSING_TIERS:
+            return jsonify({'error': f"Unknown processing tier: {requested_tier}"}), 400
+        latency_budget_ms = request.form.get('latency_budget_ms') or request.headers.get('X-Latency-Budget-Ms')
+        latency_budget = parse_latency_budget(latency_budget_ms)
+        if latency_budget_ms and latency_budget is None:
+            return jsonify({'error': f"Invalid latency budget: {latency_budget_ms} "
+                                     f"(expected a positive number of milliseconds)"}), 400
+        requested_kind = requested_profiler()
+        try:
+            profile_kind = profiler.choose(requested_kind)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Precomputed noise profile of the recording device or room, if there is one
+        noise_profile_id = request.form.get('noise_profile') or request.headers.get('X-Noise-Profile')
+        noise_profile = None
+        if noise_profile_id:
+            try:
+                noise_profile = noise_profiles.get(noise_profile_id)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if noise_profile is None:
+                print(f"No noise profile '{noise_profile_id}', estimating the noise from the upload")
+
+        # Access the uploaded file and save it to a temporary path unique to this request
         audio_file = request.files['file']
-        file_path = "temp_audio.wav"  # Temporary path to save the uploaded file
-        audio_file.save(file_path)
+        fd, file_path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            audio_file.save(file_path)
+            audio_seconds = audio_duration(file_path) or MEDIAN_LENGTH
 
-        # Process the audio file
-        predictions = process_audio_pipeline(file_path)
+            with profiler.profile(profile_kind, 'process-audio') as profile, \
+                    tier_selector.track_request() as queue_depth:
+                tier, reason = tier_selector.select(requested_tier, latency_budget, queue_depth, audio_seconds)
+
+                # Process the audio file
+                stats = {}
+                predictions = process_audio_pipeline(file_path, stats, tier, noise_profile, model_registry)
+                # Profiled requests run slower, so they would skew the latency estimates
+                if predictions is not None and profile_kind is None:
+                    tier_selector.observe(tier, stats['timings'], stats['audio_seconds'])
+        finally:
+            os.remove(file_path)
         scalar_value = predictions[0][0]
-        print(scalar_value)
+        print(scalar_value, f"tier={tier} ({reason})", stats)
+
+        # Record how long the first real request took after startup
+        with _first_request_lock:
+            if 'first_request' not in startup_timings:
+                startup_timings['first_request'] = time.perf_counter() - start
+                print(f"First request served in {startup_timings['first_request']:.3f}s")
 
         # Determine the result based on the scalar value
-        result = 1 if scalar_value > 0.8 else 0
+        result = 1 if scalar_value > RESULT_THRESHOLD else 0
 
-        # Return the result as a response
-        return jsonify({'result': result})
+        # Return the result as a response, with the tier used and the memory the request needed
+        response = {'result': result, 'tier': tier}
+        if 'peak_memory_concurrent' in stats:
+            # The peak is process-wide, so it is only reported for a request that ran alone
+            response['peak_memory_concurrent'] = stats['peak_memory_concurrent']
+            if 'peak_memory_mb' in stats:
+                response['peak_memory_mb'] = round(stats['peak_memory_mb'], 1)
+            else:
+                response['max_rss_mb'] = round(stats['max_rss_mb'], 1)
+        if requested_kind:
+            response['profile'] = profile['name']
+        if noise_profile is not None and PROCESSING_TIERS[tier]['denoise']:
+            response['noise_profile'] = noise_profile_id
+        return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000, debug=True)
 
+@app.route('/feature-config', methods=['GET'])
+def feature_config():
+    """
+    The feature configuration clients must compute features with for /predict-features.
+    """
+    return jsonify({**FEATURE_CONFIG, 'input_shape': model_registry.input_shape(), 'dtypes': FEATURE_DTYPES})
+
+
+@app.route('/predict-features', methods=['POST'])
+def predict_features():
+    """
+    Score a feature matrix computed by the client (see features.py), skipping
+    the server-side DSP and MFCC stages. The body is a .npy array of float16
+    or float32 values, sent raw (application/octet-stream) or as the 'file'
+    field of a form, and the X-Feature-Version header or feature_version
+    field gives the version of the feature configuration it was computed with.
+    """
+    try:
+        expected_shape = model_registry.input_shape()
+        max_size = max_payload_size(expected_shape)
+        # Bounds the form and raw bodies alike, chunked uploads without a
+        # Content-Length included: reading stops one byte past the limit
+        request.max_content_length = max_size + 1
+        try:
+            version = request.form.get('feature_version') or request.headers.get('X-Feature-Version')
+            data = request.files['file'].read() if 'file' in request.files else request.get_data()
+        except RequestEntityTooLarge:
+            data = None
+        if data is None or len(data) > max_size:
+            return jsonify({'error': 'Feature payload too large'}), 413
+        if not version:
+            return jsonify({'error': 'Missing feature version (X-Feature-Version header)'}), 400
+
+        try:
+            features = decode_features(data, version, expected_shape)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with tier_selector.track_request():
+            stats = {}
+            with timed_stage(stats, 'inference'):
+                predictions = model_registry.predict(features)
+        scalar_value = predictions[0][0]
+        print(scalar_value, f"features v{version}", stats)
+
+        result = 1 if scalar_value > RESULT_THRESHOLD else 0
+        return jsonify({'result': result, 'feature_version': int(version)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    """
+    Show or change the profiling settings. POST a JSON object with any of
+    'sample_rate' (fraction of requests to profile), 'profile_next' (number
+    of upcoming requests to profile) and 'kind' ('cprofile' or 'sampling').
+    """
+    if not is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    if request.method == 'POST':
+        settings = request.get_json(force=True)
+        try:
+            profiler.configure(settings.get('sample_rate'), settings.get('profile_next'), settings.get('kind'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(profiler.settings())
+
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify({'profiles': profiler.list_profiles()})
+
+
+@app.route('/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """
+    Download a profile; ?format=text returns a pstats summary of cProfile profiles.
+    """
+    if not is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    path = profiler.profile_path(name)
+    if path is None:
+        return jsonify({'error': 'not found'}), 404
+    if request.args.get('format') == 'text' and name.endswith('.prof'):
+        return Response(profiler.summarise(path), mimetype='text/plain')
+    return send_file(path, as_attachment=True)
+
+
+@sock.route('/stream-audio')
+def stream_audio(ws):
+    """
+    Streaming variant of /process-audio. The client first sends a JSON text
+    message such as {"sample_rate": 16000, "format": "int16"}, then binary
+    messages of little-endian mono PCM as it is captured, then the text
+    message {"event": "end"}. The audio is processed block by block while it
+    arrives, and the result is sent back as a JSON text message as soon as
+    the stream ends or the analysis window is full. The stream counts as a
+    request in flight for the tier selection while it is open.
+    """
+    def receive():
+        message = ws.receive(timeout=STREAM_RECEIVE_TIMEOUT)
+        if message is None:
+            raise TimeoutError(f"No message received for {STREAM_RECEIVE_TIMEOUT:g}s")
+        return message
+
+    try:
+        config = json.loads(receive())
+        sample_format = config.get('format', 'float32')
+        if sample_format not in STREAM_SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        dtype = STREAM_SAMPLE_FORMATS[sample_format]
+        sample_rate = int(config['sample_rate'])
+        if not 0 < sample_rate <= STREAM_MAX_SAMPLE_RATE:
+            raise ValueError(f"Invalid sample rate: {sample_rate}")
+        max_samples = int(STREAM_MAX_SECONDS * sample_rate)
+
+        with tier_selector.track_request():
+            session = StreamingSession(sample_rate)
+            received = 0
+            while not session.window_full:
+                message = receive()
+                if isinstance(message, str):
+                    if json.loads(message).get('event') == 'end':
+                        break
+                    continue
+                samples = np.frombuffer(message, dtype=dtype).astype(np.float32)
+                if dtype == '<i2':
+                    samples /= 32768.0
+                received += samples.size
+                if received > max_samples:
+                    raise ValueError(f"Stream longer than {STREAM_MAX_SECONDS:.0f}s")
+                session.feed(samples)
+
+            start = time.perf_counter()
+            predictions = session.finalize(model_registry)
+        scalar_value = float(predictions[0][0])
+        print(f"Streaming inference completed {time.perf_counter() - start:.3f}s after the stream ended, "
+              f"predictions: {predictions}")
+
+        result = 1 if scalar_value > RESULT_THRESHOLD else 0
+        ws.send(json.dumps({'result': result}))
+    except Exception as e:
+        ws.send(json.dumps({'error': str(e)}))
+
+
+@app.route('/admin/models', methods=['GET'])
+def list_models():
+    """
+    The primary and shadow models with their latencies and, for the shadows,
+    how often their decision agrees with the primary's.
+    """
+    if not is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify(model_registry.summary())
+
+
+@app.route('/admin/noise-profiles', methods=['GET'])
+def list_noise_profiles():
+    if not is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify({'noise_profiles': noise_profiles.list()})
+
+
+@app.route('/admin/noise-profiles/<profile_id>', methods=['POST'])
+def build_noise_profile(profile_id):
+    """
+    Build the noise profile of a device or room from an uploaded noise-only recording.
+    """
+    if not is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    fd, file_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        request.files['file'].save(file_path)
+        profile = noise_profiles.build(profile_id, file_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        os.remove(file_path)
+    return jsonify({'noise_profile': profile_id, 'sample_rate': profile.sr, 'bins': len(profile.mean_db)})
+
+
+# Warm up in the background so /healthz answers while the model is loading
+threading.Thread(target=warm_up_backend, daemon=True).start()
+
+if __name__ == '__main__':
+    # The reloader would start a second process and warm up twice
+    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
@@ -0,0 +1,116 @@
+"""
+Benchmark how the CPUs are split between worker processes and their threads.
+
+For each split, a pool of freshly started workers, each with the thread
+budget of thread_budget.py, processes the same synthetic request as fast as
+it can. The script reports the throughput and the median and p99 processing
+time of a request. The 'default' split runs one worker per CPU with every
+thread pool left at its library default: the oversubscribed setup the
+budget replaces.
+
+Usage:
+    python bench_thread_budget.py [--splits 1x4 2x2 4x1 default] [--requests 24] [--seconds 30]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+import thread_budget  # ahead of numpy: the spawned workers size their pools from it
+import numpy as np
+
+SAMPLE_RATE = 22050
+
+# Signal processed by the current worker, set by _init_worker
+_signal = None
+
+
+def parse_split(text):
+    """
+    :param text: str, 'WxT' (W workers with T threads each) or 'default'
+    :return: tuple (workers, threads), threads being None for library defaults
+    """
+    if text == 'default':
+        return thread_budget.CPU_LIMIT, None
+    workers, threads = text.lower().split('x')
+    return int(workers), int(threads)
+
+
+def default_splits(cpus):
+    workers = sorted({w for w in (1, 2, 4, 8, 16, 32, 64) if w <= cpus} | {cpus})
+    return [f"{w}x{cpus // w}" for w in workers] + ['default']
+
+
+def synthetic_request(seconds, sr=SAMPLE_RATE):
+    t = np.arange(int(seconds * sr)) / sr
+    rng = np.random.default_rng(0)
+    y = 0.01 * rng.standard_normal(t.size) + 0.3 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    return y.astype(np.float32)
+
+
+def _init_worker(seconds, barrier):
+    global _signal
+    from script import get_interpreter, warm_up
+
+    get_interpreter()
+    warm_up()
+    _signal = synthetic_request(seconds)
+    # Start timing only once every worker is warm
+    barrier.wait()
+
+
+def _process_request(_):
+    from script import process_audio_signal
+
+    start = time.time()
+    process_audio_signal(_signal, SAMPLE_RATE)
+    return start, time.time()
+
+
+def run_split(workers, threads, requests, seconds):
+    """
+    :return: dict with the throughput and the p50 and p99 processing times
+    """
+    saved = dict(os.environ)
+    # The spawned workers import thread_budget afresh and read these settings
+    for name in thread_budget.THREAD_ENV_VARS:
+        os.environ.pop(name, None)
+    if threads is None:
+        os.environ['THREAD_BUDGET'] = '0'
+    else:
+        os.environ.update(THREAD_BUDGET='1', WORKERS=str(workers), THREADS_PER_WORKER=str(threads),
+                          REQUEST_THREADS='1')
+    try:
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(workers)
+        with context.Pool(workers, initializer=_init_worker, initargs=(seconds, barrier)) as pool:
+            times = np.array(pool.map(_process_request, range(requests), chunksize=1))
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+    latencies = times[:, 1] - times[:, 0]
+    return {'throughput': requests / (times[:, 1].max() - times[:, 0].min()),
+            'p50': float(np.percentile(latencies, 50)), 'p99': float(np.percentile(latencies, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--splits', nargs='+', default=None,
+                        help="splits to run, as WORKERSxTHREADS or 'default' (default: powers of two up to the CPUs)")
+    parser.add_argument('--requests', type=int, default=24, help="requests processed per split")
+    parser.add_argument('--seconds', type=float, default=30.0, help="length of the synthetic recording")
+    args = parser.parse_args()
+
+    print(f"{thread_budget.CPU_LIMIT} CPUs (cgroup quota: {thread_budget.cgroup_cpu_quota()}), "
+          f"{args.requests} requests of {args.seconds:.0f}s per split\n")
+    print(f"{'split':<10}{'workers':>8}{'threads':>9}{'req/s':>10}{'p50 s':>9}{'p99 s':>9}")
+    for split in args.splits or default_splits(thread_budget.CPU_LIMIT):
+        workers, threads = parse_split(split)
+        result = run_split(workers, threads, args.requests, args.seconds)
+        print(f"{split:<10}{workers:>8}{threads or 'default':>9}{result['throughput']:>10.3f}"
+              f"{result['p50']:>9.2f}{result['p99']:>9.2f}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Measure how far scores move between DSP quality tiers on a held-out set.
+
+Every recording under the directory is scored with each tier in
+PROCESSING_TIERS. The summary reports, per tier, the mean processing time
+and how its scores and labels differ from the 'full' tier the model was
+trained with.
+
+Usage:
+    python evaluate_tiers.py heldout/ [--workers 4] [--output tier_scores.csv]
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+
+import thread_budget  # ahead of numpy, so this process's pools are sized too
+import numpy as np
+
+from score_recordings import find_recordings
+from script import (MODEL_PATH, RESULT_THRESHOLD, PROCESSING_TIERS, DEFAULT_TIER, get_interpreter, load_audio,
+                    process_audio_signal, warm_up)
+
+# Model used by the current worker process, set by _init_worker
+_model_path = MODEL_PATH
+
+
+def _init_worker(model_path, threads):
+    global _model_path
+    thread_budget.limit_threads(threads)
+    _model_path = model_path
+    get_interpreter(model_path)
+    for tier in PROCESSING_TIERS:
+        warm_up(tflite_model_path=model_path, tier=tier)
+
+
+def score_all_tiers(path):
+    """
+    Score one recording with every tier.
+    :return: dict, tier -> (score, seconds), or None if the recording failed
+    """
+    try:
+        y, sr = load_audio(path)
+        results = {}
+        for tier in PROCESSING_TIERS:
+            start = time.perf_counter()
+            predictions = process_audio_signal(y, sr, tflite_model_path=_model_path, tier=tier)
+            results[tier] = (float(predictions[0][0]), time.perf_counter() - start)
+        return results
+    except Exception as e:
+        print(f"Error scoring {path}: {e}")
+        return None
+
+
+def summarise(results, threshold=RESULT_THRESHOLD, reference=DEFAULT_TIER):
+    """
+    :param results: list of dicts as returned by score_all_tiers
+    :return: dict, tier -> summary statistics against the reference tier
+    """
+    reference_scores = np.array([r[reference][0] for r in results])
+    summary = {}
+    for tier in PROCESSING_TIERS:
+        scores = np.array([r[tier][0] for r in results])
+        seconds = np.array([r[tier][1] for r in results])
+        delta = np.abs(scores - reference_scores)
+        summary[tier] = {
+            'mean_seconds': float(seconds.mean()),
+            'mean_abs_delta': float(delta.mean()),
+            'p95_abs_delta': float(np.percentile(delta, 95)),
+            'max_abs_delta': float(delta.max()),
+            'label_agreement': float(np.mean((scores > threshold) == (reference_scores > threshold))),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help="directory of held-out recordings")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes, sharing the CPUs (default: one per CPU, or CPUs / THREADS_PER_WORKER)")
+    parser.add_argument('--model', default=MODEL_PATH, help="TFLite model to score with")
+    parser.add_argument('--threshold', type=float, default=RESULT_THRESHOLD)
+    parser.add_argument('--output', help="optional CSV file for the per-recording scores")
+    args = parser.parse_args()
+
+    paths = [os.path.join(args.root, path) for path in find_recordings(args.root)]
+    workers, threads = thread_budget.pool_plan(args.workers)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(args.model, threads)) as pool:
+        scored = [(path, r) for path, r in zip(paths, pool.map(score_all_tiers, paths)) if r is not None]
+    if not scored:
+        raise SystemExit("No recordings could be scored.")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path'] + [f'{tier}_{field}' for tier in PROCESSING_TIERS for field in ('score', 's')])
+            for path, r in scored:
+                writer.writerow([path] + [value for tier in PROCESSING_TIERS for value in r[tier]])
+
+    summary = summarise([r for _, r in scored], args.threshold)
+    print(f"{len(scored)} recordings, differences against the '{DEFAULT_TIER}' tier:")
+    print(f"{'tier':<10}{'mean s':>10}{'mean |d|':>12}{'p95 |d|':>12}{'max |d|':>12}{'labels agree':>14}")
+    for tier, s in summary.items():
+        print(f"{tier:<10}{s['mean_seconds']:>10.3f}{s['mean_abs_delta']:>12.4f}{s['p95_abs_delta']:>12.4f}"
+              f"{s['max_abs_delta']:>12.4f}{s['label_agreement']:>14.1%}")
+
+
+if __name__ == '__main__':
+    main()
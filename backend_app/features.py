@@ -0,0 +1,138 @@
+"""
+Reference feature extraction for clients and batch jobs.
+
+The model's input is the MFCC matrix that script.extract_features computes
+from a recording. A client that computes it itself can send it to
+/predict-features instead of uploading the recording: the server skips its
+DSP and MFCC stages, and a float16 matrix is a few hundred kilobytes where
+the recording is megabytes. Features travel as a .npy array together with
+the version of the feature configuration they were computed with, so the
+server can reject features computed with settings the model was not
+trained with.
+
+Usage:
+    python features.py recording.wav features.npy [--dtype float32]
+    python features.py recording.wav --url http://localhost:5000/predict-features
+"""
+import argparse
+import io
+import json
+import urllib.request
+
+import numpy as np
+
+from script import (TARGET_SAMPLE_RATE, MEDIAN_LENGTH, CHUNK_DURATION_MS, OVERLAP_FACTOR, TARGET_CHUNK_LENGTH,
+                    N_MFCC, N_FFT, N_MELS, MFCC_HOP_LENGTH, DEFAULT_TIER, extract_features, load_audio)
+
+# Version of the feature computation below; bump it whenever the settings
+# or the processing in extract_features change
+FEATURE_VERSION = 1
+FEATURE_CONFIG = {
+    'version': FEATURE_VERSION,
+    'sample_rate': TARGET_SAMPLE_RATE,
+    'duration_s': MEDIAN_LENGTH,
+    'chunk_duration_ms': CHUNK_DURATION_MS,
+    'overlap_factor': OVERLAP_FACTOR,
+    'chunk_length': TARGET_CHUNK_LENGTH,
+    'n_mfcc': N_MFCC,
+    'n_fft': N_FFT,
+    'n_mels': N_MELS,
+    'hop_length': MFCC_HOP_LENGTH,
+    'tier': DEFAULT_TIER,
+}
+# Feature versions the server accepts
+SUPPORTED_VERSIONS = (FEATURE_VERSION,)
+# Element types accepted in feature payloads
+FEATURE_DTYPES = ('float16', 'float32')
+
+
+def compute_features(file_path, tier=DEFAULT_TIER, noise_profile=None):
+    """
+    Compute the model input for a recording exactly as the server does.
+    :param file_path: str, path to the recording
+    :return: numpy array of shape (n_frames, N_MFCC), float32
+    """
+    y, sr = load_audio(file_path)
+    return extract_features(y, sr, tier=tier, noise_profile=noise_profile)
+
+
+def encode_features(features, dtype='float16'):
+    """
+    :param features: numpy array, the model input
+    :param dtype: str, one of FEATURE_DTYPES; float16 halves the payload
+    :return: bytes, the features as a .npy file
+    """
+    if dtype not in FEATURE_DTYPES:
+        raise ValueError(f"Unsupported feature dtype: {dtype}")
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(features, dtype=dtype), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def max_payload_size(expected_shape):
+    """
+    :return: int, bytes a valid payload for the shape can take at most (float32 plus the .npy header)
+    """
+    return int(np.prod(expected_shape)) * 4 + 4096
+
+
+def decode_features(data, version, expected_shape):
+    """
+    Parse and validate a feature payload sent by a client.
+    :param data: bytes, a .npy file of float16 or float32 values
+    :param version: str or int, the feature version the client declared
+    :param expected_shape: tuple, shape of one model input, without the batch dimension
+    :return: numpy array of the expected shape, float32
+    """
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid feature version: {version}")
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported feature version {version}, supported: {list(SUPPORTED_VERSIONS)}")
+
+    try:
+        features = np.load(io.BytesIO(data), allow_pickle=False)
+    except (ValueError, OSError, EOFError) as e:
+        raise ValueError(f"Invalid .npy payload: {e}")
+    if not isinstance(features, np.ndarray):
+        raise ValueError("Expected a single .npy array")
+    if features.dtype.name not in FEATURE_DTYPES:
+        raise ValueError(f"Unsupported feature dtype {features.dtype.name}, supported: {list(FEATURE_DTYPES)}")
+
+    # A leading batch dimension of one is accepted too
+    if features.ndim == len(expected_shape) + 1 and features.shape[0] == 1:
+        features = features[0]
+    if features.shape != tuple(expected_shape):
+        raise ValueError(f"Expected features of shape {tuple(expected_shape)}, got {features.shape}")
+
+    features = features.astype(np.float32)
+    if not np.isfinite(features).all():
+        raise ValueError("Features contain NaN or infinite values")
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help="audio file to compute the features of")
+    parser.add_argument('output', nargs='?', help=".npy file to write the features to")
+    parser.add_argument('--dtype', default='float16', choices=FEATURE_DTYPES)
+    parser.add_argument('--url', help="/predict-features URL to send the features to")
+    args = parser.parse_args()
+    if not args.output and not args.url:
+        parser.error("give an output file, a --url, or both")
+
+    payload = encode_features(compute_features(args.recording), args.dtype)
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(payload)
+        print(f"Wrote {len(payload)} bytes of version {FEATURE_VERSION} features to {args.output}")
+    if args.url:
+        request = urllib.request.Request(args.url, data=payload, method='POST', headers={
+            'Content-Type': 'application/octet-stream', 'X-Feature-Version': str(FEATURE_VERSION)})
+        with urllib.request.urlopen(request) as response:
+            print(f"Response: {json.loads(response.read())}")
+
+
+if __name__ == '__main__':
+    main()
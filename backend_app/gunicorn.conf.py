@@ -0,0 +1,30 @@
+# Gunicorn settings for serving app.py with several workers per container:
+#     gunicorn -c gunicorn.conf.py app:app
+# The worker count and each worker's thread pools come from the thread budget
+# (WORKERS, THREADS_PER_WORKER), so the workers together use the container's
+# CPUs without oversubscribing them.
+import os
+
+# Must be set before thread_budget reads it, see below
+os.environ.setdefault('REQUEST_THREADS', '4')
+
+import thread_budget
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = thread_budget.WORKERS
+
+# Threaded workers, so a worker can hold WebSocket streams open while serving
+# uploads. Every one of these threads can be running a CPU-bound request, so
+# the thread budget splits the worker's cores between them: each request's
+# native pools get THREADS_PER_WORKER / REQUEST_THREADS threads. Once all of
+# them are busy, further requests wait in the listen backlog, which is why
+# the tier selector degrades as a worker's in-flight requests approach this.
+worker_class = 'gthread'
+threads = thread_budget.REQUEST_THREADS
+
+# A request includes a multi-second inference, and workers warm up after forking
+timeout = int(os.environ.get('WORKER_TIMEOUT', 120))
+
+
+def when_ready(server):
+    server.log.info(f"Thread budget: {thread_budget.settings()}")
@@ -0,0 +1,194 @@
+import collections
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from script import MODEL_PATH, RESULT_THRESHOLD, get_interpreter, run_inference_on_tflite_model
+
+# Model whose decision is returned to clients
+PRIMARY_MODEL = os.environ.get('PRIMARY_MODEL', MODEL_PATH)
+# Candidate models scored on the same features and only logged, as
+# comma-separated "name=path" entries (or bare paths, named after the file)
+SHADOW_MODELS = os.environ.get('SHADOW_MODELS', '')
+# Shadow requests allowed to queue up before new ones are dropped, so shadow
+# scoring never builds an unbounded backlog under load
+SHADOW_MAX_PENDING = int(os.environ.get('SHADOW_MAX_PENDING', 8))
+# Optional JSON-lines file receiving one record per shadow comparison
+SHADOW_LOG = os.environ.get('SHADOW_LOG')
+
+
+def parse_models(spec):
+    """
+    :param spec: str, comma-separated "name=path" entries or bare paths
+    :return: dict, model name -> model path
+    """
+    models = {}
+    for entry in filter(None, (entry.strip() for entry in spec.split(','))):
+        name, _, path = entry.rpartition('=')
+        if not name:
+            name = os.path.splitext(os.path.basename(path))[0]
+        if name in models:
+            raise ValueError(f"Duplicate model name: {name}")
+        models[name] = path
+    return models
+
+
+class ModelLatency:
+    """Running latency statistics of one model."""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        self.recent.append(seconds)
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        recent = np.array(self.recent)
+        return {'count': self.count, 'mean_ms': round(self.total_seconds / self.count * 1000, 2),
+                'p95_ms': round(float(np.percentile(recent, 95)) * 1000, 2),
+                'max_ms': round(float(recent.max()) * 1000, 2)}
+
+
+class ModelRegistry:
+    """
+    A primary model and any number of shadow models sharing one feature
+    computation. The MFCC matrix of a request is scored by the primary, whose
+    predictions are returned, and then handed to the shadow models on a
+    background thread, so the candidates add interpreter time only and never
+    delay the response. Shadow scores are logged next to the primary's.
+    That thread runs the model like a request thread does, so the thread
+    budget counts it when SHADOW_MODELS is set (thread_budget.SHADOW_THREADS)
+    and a busy worker's interpreters still fit its cores.
+    """
+
+    def __init__(self, primary=PRIMARY_MODEL, shadows=SHADOW_MODELS, max_pending=SHADOW_MAX_PENDING,
+                 log_path=SHADOW_LOG, threshold=RESULT_THRESHOLD):
+        """
+        :param primary: str, path of the primary model
+        :param shadows: str or dict, shadow models as accepted by parse_models, or name -> path
+        """
+        self.primary_name = os.path.splitext(os.path.basename(primary))[0]
+        self.models = {self.primary_name: primary}
+        shadow_models = parse_models(shadows) if isinstance(shadows, str) else dict(shadows)
+        if self.primary_name in shadow_models:
+            raise ValueError(f"Shadow model name clashes with the primary: {self.primary_name}")
+        self.models.update(shadow_models)
+        self.shadow_names = list(shadow_models)
+        self.max_pending = max_pending
+        self.log_path = log_path
+        self.threshold = threshold
+
+        self.latency = {name: ModelLatency() for name in self.models}
+        self.agreement = {name: collections.Counter() for name in self.shadow_names}
+        self.dropped = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        # One thread scores the shadows request after request, leaving the
+        # other cores to primary traffic
+        self._executor = (concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-models')
+                          if self.shadow_names else None)
+
+    @property
+    def primary_path(self):
+        return self.models[self.primary_name]
+
+    def input_shape(self):
+        """
+        :return: tuple, shape of one input of the primary model, without the batch dimension
+        """
+        interpreter, _ = get_interpreter(self.primary_path)
+        return tuple(int(size) for size in interpreter.get_input_details()[0]['shape'][1:])
+
+    def load(self):
+        """
+        Load every model and run it once. Shadow models must take the same
+        input as the primary, since they are fed the primary's features.
+        """
+        primary_interpreter, _ = get_interpreter(self.primary_path)
+        expected = primary_interpreter.get_input_details()[0]
+        for name in self.shadow_names:
+            interpreter, _ = get_interpreter(self.models[name])
+            details = interpreter.get_input_details()[0]
+            if tuple(details['shape']) != tuple(expected['shape']) or details['dtype'] != expected['dtype']:
+                raise ValueError(f"Shadow model {name} expects input {tuple(details['shape'])} "
+                                 f"{np.dtype(details['dtype']).name}, the primary {tuple(expected['shape'])} "
+                                 f"{np.dtype(expected['dtype']).name}")
+            run_inference_on_tflite_model(np.zeros(details['shape'][1:], dtype=details['dtype']), self.models[name])
+
+    def predict(self, mfcc_data):
+        """
+        Score the features with the primary model and queue them for the shadows.
+        :param mfcc_data: numpy array, the model input without its batch dimension
+        :return: the primary model's predictions
+        """
+        start = time.perf_counter()
+        predictions = run_inference_on_tflite_model(mfcc_data, self.primary_path)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.latency[self.primary_name].add(seconds)
+
+        if self._executor is not None:
+            with self._lock:
+                if self._pending >= self.max_pending:
+                    self.dropped += 1
+                    return predictions
+                self._pending += 1
+            # The features are not modified after this point, so the shadows can share them
+            self._executor.submit(self._score_shadows, mfcc_data, float(predictions[0][0]), seconds)
+        return predictions
+
+    def _score_shadows(self, mfcc_data, primary_score, primary_seconds):
+        try:
+            record = {'time': time.time(),
+                      'models': {self.primary_name: {'score': primary_score,
+                                                     'ms': round(primary_seconds * 1000, 2)}}}
+            primary_result = primary_score > self.threshold
+            for name in self.shadow_names:
+                try:
+                    start = time.perf_counter()
+                    score = float(run_inference_on_tflite_model(mfcc_data, self.models[name])[0][0])
+                    seconds = time.perf_counter() - start
+                except Exception as e:
+                    print(f"Shadow model {name} failed: {e}")
+                    record['models'][name] = {'error': str(e)}
+                    continue
+                with self._lock:
+                    self.latency[name].add(seconds)
+                    self.agreement[name]['agree' if (score > self.threshold) == primary_result else 'disagree'] += 1
+                record['models'][name] = {'score': score, 'ms': round(seconds * 1000, 2)}
+                print(f"Shadow model {name}: score {score:.4f} (primary {primary_score:.4f}), "
+                      f"{seconds * 1000:.1f} ms")
+            self._write_log(record)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _write_log(self, record):
+        if self.log_path:
+            with self._lock, open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def summary(self):
+        """
+        :return: dict, per-model latency and, for shadows, agreement with the primary's decisions
+        """
+        with self._lock:
+            models = {}
+            for name, path in self.models.items():
+                models[name] = {'path': path, 'role': 'primary' if name == self.primary_name else 'shadow',
+                                'latency': self.latency[name].summary()}
+                if name in self.agreement:
+                    counts = self.agreement[name]
+                    total = counts['agree'] + counts['disagree']
+                    models[name]['label_agreement'] = counts['agree'] / total if total else None
+            return {'models': models, 'shadow_pending': self._pending, 'shadow_dropped': self.dropped}
@@ -0,0 +1,223 @@
+"""
+Precomputed noise profiles and a vectorized stationary spectral gate.
+
+Recordings made in the same clinic room share the same background noise, so
+its spectral statistics can be measured once from a noise-only recording and
+reused for every upload from that room, instead of estimating the noise
+again on each request. Profiles are stored by id as .npz files.
+
+Usage:
+    python noise_profiles.py build room-1 room1_noise.wav
+    python noise_profiles.py list
+"""
+import argparse
+import contextlib
+import functools
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+NOISE_PROFILE_DIR = os.environ.get('NOISE_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                     'noise_profiles'))
+PROFILE_ID = re.compile(r'^[\w-]{1,64}$')
+
+# STFT and gate parameters, the noisereduce defaults
+N_FFT = 1024
+HOP_LENGTH = N_FFT // 4
+N_STD_THRESH = 1.5
+PROP_DECREASE = 0.9
+FREQ_MASK_SMOOTH_HZ = 500
+TIME_MASK_SMOOTH_MS = 50
+EPS = np.finfo(np.float32).eps
+
+
+class NoiseProfile:
+    """
+    Per-frequency mean and standard deviation, in dB, of the STFT magnitude
+    of a noise-only recording.
+    """
+
+    def __init__(self, mean_db, std_db, sr, n_fft=N_FFT):
+        self.mean_db = np.asarray(mean_db, dtype=np.float32)
+        self.std_db = np.asarray(std_db, dtype=np.float32)
+        self.sr = int(sr)
+        self.n_fft = int(n_fft)
+
+    @classmethod
+    def from_noise(cls, noise, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        """
+        Measure the noise statistics of a noise-only signal.
+        """
+        if len(noise) < n_fft:
+            raise ValueError("Noise recording is shorter than one STFT frame.")
+        noise_db = _magnitude_db(_stft(np.asarray(noise, dtype=np.float32), n_fft, hop_length))
+        return cls(noise_db.mean(axis=1), noise_db.std(axis=1), sr, n_fft)
+
+    def threshold(self, sr, n_fft=N_FFT, n_std_thresh=N_STD_THRESH):
+        """
+        Gate threshold in dB for each STFT bin at the given sample rate. The
+        statistics are interpolated over frequency when the rate differs from
+        the one the profile was measured at.
+        """
+        threshold = self.mean_db + n_std_thresh * self.std_db
+        if sr == self.sr and n_fft == self.n_fft:
+            return threshold
+        profile_freqs = np.fft.rfftfreq(self.n_fft, 1 / self.sr)
+        return np.interp(np.fft.rfftfreq(n_fft, 1 / sr), profile_freqs, threshold).astype(np.float32)
+
+    def save(self, path):
+        np.savez(path, mean_db=self.mean_db, std_db=self.std_db, sr=self.sr, n_fft=self.n_fft)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['mean_db'], data['std_db'], int(data['sr']), int(data['n_fft']))
+
+
+def _stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    import librosa
+
+    return librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
+
+
+def _magnitude_db(stft):
+    return 20 * np.log10(np.abs(stft) + EPS)
+
+
+@functools.lru_cache(maxsize=16)
+def _smoothing_filter(sr, n_fft, hop_length):
+    # Triangular smoothing over FREQ_MASK_SMOOTH_HZ and TIME_MASK_SMOOTH_MS, as in noisereduce
+    n_freq = max(1, int(FREQ_MASK_SMOOTH_HZ / (sr / (n_fft / 2))))
+    n_time = max(1, int(TIME_MASK_SMOOTH_MS / (hop_length / sr * 1000)))
+    smoothing = np.outer(
+        np.concatenate([np.linspace(0, 1, n_freq + 1, endpoint=False), np.linspace(1, 0, n_freq + 2)])[1:-1],
+        np.concatenate([np.linspace(0, 1, n_time + 1, endpoint=False), np.linspace(1, 0, n_time + 2)])[1:-1],
+    )
+    return (smoothing / smoothing.sum()).astype(np.float32)
+
+
+def spectral_gate(y, sr, profile, prop_decrease=PROP_DECREASE, n_std_thresh=N_STD_THRESH,
+                  n_fft=N_FFT, hop_length=HOP_LENGTH, smooth=False):
+    """
+    Stationary spectral gating against a precomputed noise profile. Bins
+    whose magnitude is below the profile's threshold are attenuated by
+    prop_decrease; the whole signal is gated with one STFT and one inverse.
+    Smoothing the mask, as noisereduce does by default, reduces musical noise
+    but costs time and, in bench_noise_profiles.py, output SNR; it is off by
+    default like in the 'fast' tier's stationary gate.
+    :param y: numpy array, the signal
+    :param sr: int, sample rate of the signal
+    :param profile: NoiseProfile of the room the signal was recorded in
+    :return: numpy array, the denoised signal (float32, same length as y)
+    """
+    import librosa
+    import scipy.signal
+
+    y = np.asarray(y, dtype=np.float32)
+    stft = _stft(y, n_fft, hop_length)
+    threshold = profile.threshold(sr, n_fft, n_std_thresh)
+
+    # 1 where the signal rises above the noise, 1 - prop_decrease elsewhere
+    mask = (_magnitude_db(stft) > threshold[:, None]).astype(np.float32)
+    if smooth:
+        mask = scipy.signal.fftconvolve(mask, _smoothing_filter(sr, n_fft, hop_length), mode='same')
+    mask *= prop_decrease
+    mask += 1.0 - prop_decrease
+
+    stft *= mask
+    return librosa.istft(stft, hop_length=hop_length, n_fft=n_fft, length=len(y))
+
+
+class NoiseProfileStore:
+    """
+    Noise profiles saved as <id>.npz in a directory. Loaded profiles are
+    cached and reloaded when their file changes, so a profile rebuilt by
+    another worker process is picked up on its next use.
+    """
+
+    def __init__(self, directory=NOISE_PROFILE_DIR):
+        self.directory = directory
+        self._cache = {}  # profile id -> (file modification time, NoiseProfile)
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id):
+        if not PROFILE_ID.match(profile_id):
+            raise ValueError(f"Invalid noise profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.npz")
+
+    def get(self, profile_id):
+        """
+        :return: NoiseProfile, or None if there is no profile with this id
+        """
+        path = self._path(profile_id)
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._cache.pop(profile_id, None)
+            return None
+        with self._lock:
+            cached = self._cache.get(profile_id)
+            if cached is None or cached[0] != modified:
+                cached = self._cache[profile_id] = (modified, NoiseProfile.load(path))
+            return cached[1]
+
+    def save(self, profile_id, profile):
+        path = self._path(profile_id)
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a file of its own, then rename, so no other process or
+        # thread saving the same id can load or install a half-written profile
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f'.{profile_id}-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                profile.save(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._cache[profile_id] = (os.stat(path).st_mtime_ns, profile)
+
+    def build(self, profile_id, noise_file):
+        """
+        Measure a noise-only recording and save its profile under the id.
+        """
+        from script import load_audio
+
+        noise, sr = load_audio(noise_file)
+        profile = NoiseProfile.from_noise(noise, sr)
+        self.save(profile_id, profile)
+        return profile
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.directory)
+                      if name.endswith('.npz') and PROFILE_ID.match(name[:-4]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=NOISE_PROFILE_DIR, help="directory the profiles are stored in")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a profile from a noise-only recording")
+    build.add_argument('id', help="device or room id")
+    build.add_argument('noise_file', help="recording of the room's background noise")
+    commands.add_parser('list', help="list the stored profiles")
+    args = parser.parse_args()
+
+    store = NoiseProfileStore(args.dir)
+    if args.command == 'build':
+        profile = store.build(args.id, args.noise_file)
+        print(f"Saved noise profile '{args.id}' ({profile.sr} Hz, {len(profile.mean_db)} bins) to {store.directory}")
+    else:
+        for profile_id in store.list():
+            print(profile_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import collections
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+# Where profiles are written and how many are kept (oldest are deleted first)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/backend-profiles')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+# Fraction of requests profiled without being asked to
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+# Interval between stack samples of the sampling profiler, in seconds
+SAMPLING_INTERVAL = float(os.environ.get('PROFILE_SAMPLING_INTERVAL', 0.005))
+
+PROFILER_KINDS = ('cprofile', 'sampling')
+PROFILE_NAME = re.compile(r'^[\w.-]+\.(prof|folded)$')
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread at a fixed interval from a
+    background thread. Much cheaper than cProfile on long requests; time
+    spent in native code (numpy, TFLite) is attributed to the Python frame
+    that called it. Results are written in the collapsed-stack format
+    understood by flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLING_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of single requests. A request is profiled when it asks
+    for it, when an admin has armed the profiler for the next requests, or
+    at random according to the sampling rate. Profiles go to a directory
+    that is rotated to keep at most max_files of them.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES, sample_rate=PROFILE_SAMPLE_RATE):
+        self.directory = directory
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        self.profile_next = 0  # requests still to profile at an admin's request
+        self.default_kind = 'cprofile'
+        self._lock = threading.Lock()
+        # Only one cProfile profiler can be active per process at a time
+        self._cprofile_lock = threading.Lock()
+
+    def settings(self):
+        return {'sample_rate': self.sample_rate, 'profile_next': self.profile_next, 'kind': self.default_kind,
+                'directory': self.directory, 'max_files': self.max_files}
+
+    def configure(self, sample_rate=None, profile_next=None, kind=None):
+        with self._lock:
+            if sample_rate is not None:
+                if not 0.0 <= sample_rate <= 1.0:
+                    raise ValueError("sample_rate must be between 0 and 1")
+                self.sample_rate = sample_rate
+            if profile_next is not None:
+                self.profile_next = max(0, int(profile_next))
+            if kind is not None:
+                if kind not in PROFILER_KINDS:
+                    raise ValueError(f"Unknown profiler kind: {kind}")
+                self.default_kind = kind
+
+    def choose(self, requested_kind=None):
+        """
+        Decide whether to profile a request.
+        :param requested_kind: str or None, profiler asked for by the request
+        :return: str or None, the profiler kind to use, or None not to profile
+        """
+        if requested_kind:
+            if requested_kind not in PROFILER_KINDS:
+                raise ValueError(f"Unknown profiler kind: {requested_kind}")
+            return requested_kind
+        with self._lock:
+            if self.profile_next > 0:
+                self.profile_next -= 1
+                return self.default_kind
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.default_kind
+        return None
+
+    @contextlib.contextmanager
+    def profile(self, kind, label):
+        """
+        Profile the block with the given profiler and save the result.
+        :param kind: str or None (the block runs unprofiled)
+        :param label: str, included in the profile's file name
+        :return: yields a dict that receives the profile's 'name' once saved
+        """
+        info = {}
+        if kind is None:
+            yield info
+            return
+
+        # Fall back to sampling if another request is already under cProfile
+        if kind == 'cprofile' and not self._cprofile_lock.acquire(blocking=False):
+            kind = 'sampling'
+
+        start = time.perf_counter()
+        if kind == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+        try:
+            yield info
+        finally:
+            if kind == 'cprofile':
+                profiler.disable()
+                self._cprofile_lock.release()
+            else:
+                profiler.stop()
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            name = self._save(profiler, kind, label, duration_ms)
+            info['name'] = name
+            print(f"Saved {kind} profile {name} ({duration_ms} ms)")
+
+    def _save(self, profiler, kind, label, duration_ms):
+        os.makedirs(self.directory, exist_ok=True)
+        label = re.sub(r'[^\w-]', '_', label)
+        extension = 'prof' if kind == 'cprofile' else 'folded'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{duration_ms}ms-{os.urandom(3).hex()}.{extension}"
+        path = os.path.join(self.directory, name)
+        if kind == 'cprofile':
+            profiler.dump_stats(path)
+        else:
+            profiler.write(path)
+        self._rotate()
+        return name
+
+    def _rotate(self):
+        profiles = sorted(self.list_profiles(), key=lambda p: p['modified'])
+        for profile in profiles[:max(0, len(profiles) - self.max_files)]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, profile['name']))
+
+    def list_profiles(self):
+        """
+        :return: list of dicts describing the saved profiles, newest first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if PROFILE_NAME.match(name):
+                # Workers share the directory, so another one's rotation may have just deleted the file
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                profiles.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime})
+        return sorted(profiles, key=lambda p: p['modified'], reverse=True)
+
+    def profile_path(self, name):
+        """
+        :return: str, path of a saved profile, or None if there is no such profile
+        """
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    @staticmethod
+    def summarise(path, limit=40):
+        """
+        Human-readable summary of a cProfile profile, sorted by cumulative time.
+        """
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,236 @@
+"""
+Score every recording under a directory tree with the backend pipeline.
+
+Recordings are scored in parallel by a pool of worker processes, each with
+its own warm interpreter, and results are streamed to a CSV file or a
+Parquet dataset (chosen by the output's extension) as they arrive. Each row
+holds the raw score, the thresholded label and the time spent in every
+stage. Recordings already scored in the output are skipped, so an
+interrupted run can be resumed by running the same command again; those
+that failed are retried, and their new row follows the failed one.
+
+Usage:
+    python score_recordings.py recordings/ results.csv [--workers 4] [--model best_model.tflite]
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+
+import thread_budget
+from script import MODEL_PATH, RESULT_THRESHOLD, get_interpreter, load_audio, process_audio_signal, warm_up
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3', '.m4a', '.aac')
+STAGES = ('load', 'denoise_effects', 'trim', 'normalise', 'mfcc', 'inference')
+COLUMNS = ['path', 'score', 'label', 'error', 'total_s'] + [f'{stage}_s' for stage in STAGES]
+
+# Model used by the current worker process, set by _init_worker
+_model_path = MODEL_PATH
+
+
+def find_recordings(root, extensions=AUDIO_EXTENSIONS):
+    """
+    All audio files under a directory, in a stable order.
+    :return: list of paths relative to root
+    """
+    recordings = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(extensions):
+                recordings.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return recordings
+
+
+def _init_worker(model_path, threads):
+    # Load the model and warm up the JIT once per worker, not per recording
+    global _model_path
+    thread_budget.limit_threads(threads)
+    _model_path = model_path
+    get_interpreter(model_path)
+    warm_up(tflite_model_path=model_path)
+
+
+def score_recording(args):
+    """
+    Score one recording in a worker process.
+    :param args: tuple (root directory, path relative to it, threshold)
+    :return: dict, one output row
+    """
+    root, path, threshold = args
+    row = {'path': path, 'score': None, 'label': None, 'error': None}
+    stats = {}
+    start = time.perf_counter()
+    try:
+        start_load = time.perf_counter()
+        y, sr = load_audio(os.path.join(root, path))
+        stats['timings'] = {'load': time.perf_counter() - start_load}
+
+        predictions = process_audio_signal(y, sr, stats, _model_path)
+        row['score'] = float(predictions[0][0])
+        row['label'] = 1 if row['score'] > threshold else 0
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    row['total_s'] = time.perf_counter() - start
+    for stage in STAGES:
+        row[f'{stage}_s'] = stats.get('timings', {}).get(stage)
+    return row
+
+
+class CsvResultWriter:
+    """Appends rows to a CSV file, flushing after each one."""
+
+    def __init__(self, path):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if not exists:
+            self._writer.writeheader()
+
+    @staticmethod
+    def completed(path):
+        """
+        :return: set, paths already scored (rows with an error are retried)
+        """
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline='') as f:
+            return {row['path'] for row in csv.DictReader(f) if row['score']}
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Writes rows to a Parquet dataset: a directory holding one part file per
+    row group. Parquet files cannot be appended to and are unreadable until
+    closed, so each part is written under a hidden name and renamed once
+    complete. A run that is killed keeps every finished part, and a resumed
+    run adds new parts next to them.
+    """
+
+    def __init__(self, path, row_group_size=256):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._schema = pa.schema(
+            [('path', pa.string()), ('score', pa.float64()), ('label', pa.int64()), ('error', pa.string())]
+            + [(column, pa.float64()) for column in COLUMNS[4:]])
+        os.makedirs(path, exist_ok=True)
+        # Part names are unique per run, so resumed runs never overwrite earlier parts
+        self._run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+        self._parts = 0
+        self._rows = []
+        self._row_group_size = row_group_size
+
+    @staticmethod
+    def completed(path):
+        """
+        :return: set, paths already scored (rows with an error are retried)
+        """
+        if not os.path.isdir(path) or not any(name.endswith('.parquet') for name in os.listdir(path)):
+            return set()
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=['path', 'score'])
+        return {path for path, score in zip(table.column('path').to_pylist(), table.column('score').to_pylist())
+                if score is not None}
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            name = f"part-{self._run_id}-{self._parts:05d}.parquet"
+            # Names starting with a dot are ignored by Parquet readers until renamed
+            tmp_path = os.path.join(self._path, f".{name}.tmp")
+            self._pq.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema), tmp_path)
+            os.replace(tmp_path, os.path.join(self._path, name))
+            self._parts += 1
+            self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def result_writer_class(output_path):
+    if output_path.endswith('.parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Writing Parquet requires pyarrow (pip install pyarrow).")
+        return ParquetResultWriter
+    return CsvResultWriter
+
+
+def score_directory(root, output_path, workers=None, model_path=MODEL_PATH, threshold=RESULT_THRESHOLD,
+                    progress_every=50):
+    """
+    Score every recording under root that is not already in the output file.
+    :return: tuple (number of recordings scored, recordings per second)
+    """
+    writer_class = result_writer_class(output_path)
+    done = writer_class.completed(output_path)
+    pending = [path for path in find_recordings(root) if path not in done]
+    print(f"{len(pending)} recordings to score ({len(done)} already in {output_path})")
+    if not pending:
+        return 0, 0.0
+
+    # Split the CPUs between the workers so their thread pools do not oversubscribe them
+    workers, threads = thread_budget.pool_plan(workers)
+    print(f"{workers} workers with {threads} thread(s) each")
+
+    writer = writer_class(output_path)
+    start = time.perf_counter()
+    scored = 0
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_path, threads)) as pool:
+            # The clock starts once the workers are warm
+            pool_start = None
+            tasks = ((root, path, threshold) for path in pending)
+            for row in pool.imap_unordered(score_recording, tasks):
+                if pool_start is None:
+                    pool_start = time.perf_counter() - row['total_s']
+                writer.write(row)
+                scored += 1
+                if row['error']:
+                    print(f"Error scoring {row['path']}: {row['error']}")
+                if scored % progress_every == 0:
+                    rate = scored / (time.perf_counter() - pool_start)
+                    print(f"{scored}/{len(pending)} recordings scored, {rate:.2f} recordings/s")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - (pool_start if pool_start is not None else start)
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"Scored {scored} recordings in {elapsed:.1f}s ({rate:.2f} recordings/s, "
+          f"{time.perf_counter() - start:.1f}s including worker start-up)")
+    return scored, rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help="directory to search for recordings")
+    parser.add_argument('output', help="results file (.csv or .parquet)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes, sharing the CPUs (default: one per CPU, or CPUs / THREADS_PER_WORKER)")
+    parser.add_argument('--model', default=MODEL_PATH, help="TFLite model to score with")
+    parser.add_argument('--threshold', type=float, default=RESULT_THRESHOLD, help="score above which label is 1")
+    args = parser.parse_args()
+
+    score_directory(args.root, args.output, args.workers, args.model, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
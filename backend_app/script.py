@@ -1,192 +1,558 @@
-import librosa
+import contextlib
+import functools
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+import thread_budget  # sizes the native thread pools, so it must come before numpy
 import numpy as np
-from pedalboard import Pedalboard, NoiseGate, Compressor, LowShelfFilter, Gain
-import tensorflow as tf
-import noisereduce as nr
+
+from noise_profiles import spectral_gate
+
+# Model shipped next to this file
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'best_model.tflite')
+
+# Scores above this threshold are reported as a positive result
+RESULT_THRESHOLD = 0.8
+
+# DSP quality tiers, from the front end the model was trained with down to
+# the cheapest one. 'denoise' is the noise reduction mode (None skips it),
+# 'effects' the Pedalboard chain and 'res_type' the librosa resampler.
+PROCESSING_TIERS = {
+    'full': {'denoise': 'nonstationary', 'effects': 'full', 'res_type': 'soxr_hq'},
+    'fast': {'denoise': 'stationary', 'effects': 'full', 'res_type': 'soxr_mq'},
+    'minimal': {'denoise': None, 'effects': 'tone', 'res_type': 'soxr_lq'},
+}
+DEFAULT_TIER = 'full'
+
+# Front-end parameters the model was trained with
+TARGET_SAMPLE_RATE = 44100
+MEDIAN_LENGTH = 63.29469387755102  # seconds
+CHUNK_DURATION_MS = 20
+OVERLAP_FACTOR = 0.5
+TARGET_CHUNK_LENGTH = 882
+N_MFCC = 13
+N_FFT = 128
+N_MELS = 128
+MFCC_HOP_LENGTH = 512
+
+# The heavy DSP and inference libraries (librosa, noisereduce, pedalboard,
+# tflite_runtime/tensorflow) are imported inside the functions that use them,
+# so importing this module stays cheap and the web server can answer health
+# checks while the models are still loading.
+
+
+def preload_modules():
+    """
+    Import the heavy DSP and inference modules ahead of the first request.
+    :return: dict, seconds spent importing each module
+    """
+    timings = {}
+    for name in ('librosa', 'noisereduce', 'pedalboard'):
+        start = time.perf_counter()
+        __import__(name)
+        timings[name] = time.perf_counter() - start
+
+    # Only the first runtime that is installed; tensorflow is imported later
+    # if tflite_runtime turns out not to be able to run the model
+    start = time.perf_counter()
+    next(_interpreter_classes())
+    timings['tflite'] = time.perf_counter() - start
+    return timings
+
+
+def _tflite_runtime_interpreter():
+    from tflite_runtime.interpreter import Interpreter
+    return Interpreter
+
+
+def _tensorflow_interpreter():
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+# Runtimes providing a TFLite interpreter class, slimmest first. Each one is
+# only imported when the ones before it are missing or cannot run the model.
+_INTERPRETER_RUNTIMES = (('tflite_runtime', _tflite_runtime_interpreter), ('tensorflow', _tensorflow_interpreter))
+
+
+def _interpreter_classes():
+    """
+    Yield the TFLite interpreter classes to try, slimmest runtime first,
+    importing each runtime only when the previous one was not enough.
+    """
+    found = False
+    for name, import_interpreter in _INTERPRETER_RUNTIMES:
+        try:
+            interpreter_class = import_interpreter()
+        except ImportError:
+            continue
+        except Exception as e:
+            # e.g. a wheel built against another NumPy major version
+            print(f"Cannot import {name}: {e!r}")
+            continue
+        found = True
+        yield interpreter_class
+    if not found:
+        raise ImportError("Neither tflite_runtime nor tensorflow is installed.")
+
+
+def load_tflite_interpreter(tflite_model_path):
+    """
+    Load a TFLite model with the lightest runtime able to run it.
+    The standalone tflite_runtime wheel has no Flex (select TF ops) delegate,
+    so models that need it fall back to the full tensorflow package, which is
+    only imported then. Any error from a runtime, such as a wheel that does
+    not match the installed NumPy, moves on to the next one.
+    :param tflite_model_path: str, path to the .tflite model
+    :return: an interpreter with its tensors allocated
+    """
+    last_error = None
+    for interpreter_class in _interpreter_classes():
+        try:
+            interpreter = interpreter_class(model_path=tflite_model_path,
+                                            num_threads=thread_budget.tflite_num_threads())
+            interpreter.allocate_tensors()
+            return interpreter
+        except Exception as e:
+            print(f"{interpreter_class.__module__} cannot run {tflite_model_path}: {e!r}")
+            last_error = e
+    raise last_error
+
+
+# Loaded interpreters, keyed by model path. TFLite interpreters are not
+# thread-safe, so each one is paired with the lock that guards it.
+_interpreters = {}
+_interpreters_lock = threading.Lock()
+
+
+def get_interpreter(tflite_model_path=MODEL_PATH):
+    """
+    Return the cached interpreter for a model, loading it on first use.
+    :return: tuple (interpreter, lock)
+    """
+    with _interpreters_lock:
+        if tflite_model_path not in _interpreters:
+            interpreter = load_tflite_interpreter(tflite_model_path)
+            _interpreters[tflite_model_path] = (interpreter, threading.Lock())
+        return _interpreters[tflite_model_path]
+
 
 # Pedalboard effect pipeline
-def get_pedalboard():
+def get_pedalboard(effects='full'):
+    """
+    :param effects: str, 'full' for the whole chain, 'tone' for its linear
+                    stages only (the low shelf and the gain), skipping the
+                    dynamics processing
+    """
+    from pedalboard import Pedalboard, NoiseGate, Compressor, LowShelfFilter, Gain
+
+    tone = [
+        LowShelfFilter(cutoff_frequency_hz=400, gain_db=10, q=1),
+        Gain(gain_db=2)
+    ]
+    if effects == 'tone':
+        return Pedalboard(tone)
     return Pedalboard([
         NoiseGate(threshold_db=-30, ratio=1.5, release_ms=250),
         Compressor(threshold_db=-16, ratio=4),
-        LowShelfFilter(cutoff_frequency_hz=400, gain_db=10, q=1),
-        Gain(gain_db=2)
-    ])
+    ] + tone)
+
+
+# Spectral-gating noise reduction
+def denoise_audio(y, sr, noise_sample, mode='nonstationary'):
+    """
+    :param mode: str, 'nonstationary' for the adaptive gate the model was
+                 trained with, 'stationary' for a cheaper gate driven by the
+                 noise sample, without mask smoothing
+    """
+    import noisereduce as nr
+
+    if mode == 'stationary':
+        return nr.reduce_noise(y=y, sr=sr, y_noise=noise_sample, prop_decrease=0.9, stationary=True,
+                               freq_mask_smooth_hz=None, time_mask_smooth_ms=None)
+    return nr.reduce_noise(y=y, sr=sr, y_noise=noise_sample, prop_decrease=0.9)
 
 
 # Noise reduction and applying effects using Pedalboard
-def process_audio_file(y, sr):
+def process_audio_file(y, sr, tier=DEFAULT_TIER, noise_profile=None):
+    """
+    :param noise_profile: optional NoiseProfile of the recording's room; when
+                          given, a stationary gate against it replaces the
+                          per-upload noise reduction
+    """
+    settings = PROCESSING_TIERS[tier]
 
-    # Select a noise profile from the first 0.5 seconds
-    noise_sample = y[:int(sr * 0.5)]  # First 0.5 seconds as noise profile
-    reduced_noise = nr.reduce_noise(y=y, sr=sr, y_noise=noise_sample, prop_decrease=0.9)
+    if settings['denoise'] and noise_profile is not None:
+        y = spectral_gate(y, sr, noise_profile)
+    elif settings['denoise']:
+        # Select a noise profile from the first 0.5 seconds
+        noise_sample = y[:int(sr * 0.5)]  # First 0.5 seconds as noise profile
+        y = denoise_audio(y, sr, noise_sample, settings['denoise'])
 
     # Apply pedalboard effects
-    board = get_pedalboard()
-    effected = board(reduced_noise, sr)
+    board = get_pedalboard(settings['effects'])
+    effected = board(y, sr)
 
     return effected, sr
 
 
-def normalize_amplitude_audio(audio_signal):
-    """
-    Normalize the amplitude of an audio signal to the range [-1, 1].
-    :param audio_signal: numpy array, raw audio signal
-    :return: numpy array, audio signal normalized to the range [-1, 1]
-    """
-    if audio_signal.size == 0:  # Check for empty signal
-        raise ValueError("Empty audio signal encountered.")
-
-    max_amplitude = np.max(np.abs(audio_signal))
-    if max_amplitude > 1:
-        normalized_signal = audio_signal / max_amplitude
-    else:
-        normalized_signal = audio_signal
-    return normalized_signal
-
-def adjust_audio_length(audio_signal, target_length, sr):
-    """
-    Adjust the length of an audio signal to the target length.
-    :param audio_signal: numpy array, the raw audio signal
-    :param target_length: float, the target length in seconds
-    :param sr: int, sample rate of the audio
-    :return: numpy array, the adjusted audio signal
-    """
-    current_length = len(audio_signal) / sr
-    if current_length < target_length:
-        # If audio is too short, pad with zeros
-        target_samples = int(target_length * sr)
-        padded_signal = np.pad(audio_signal, (0, target_samples - len(audio_signal)), mode='constant')
-        return padded_signal
-    else:
-        # If audio is too long, truncate it
-        target_samples = int(target_length * sr)
-        truncated_signal = audio_signal[:target_samples]
-        return truncated_signal
-
-def normalise_audio(audio_signal, sr, target_sample_rate=44100, median_length=63.29469387755102):
+def normalise_audio(audio_signal, sr, target_sample_rate=TARGET_SAMPLE_RATE, median_length=MEDIAN_LENGTH, out=None,
+                    res_type='soxr_hq'):
     """
-    Process an audio signal: normalize, stretch, and adjust its duration.
+    Process an audio signal: resample, normalize its amplitude to [-1, 1] and
+    pad or truncate it to the median duration, in a single pass over the
+    samples and without intermediate copies.
 
     :param audio_signal: numpy array, raw audio signal
     :param sr: int, sample rate of the audio signal
     :param target_sample_rate: int, target sampling rate for processing (default is 44100 Hz)
     :param median_length: float, median duration of the audio files in seconds
-    :return: Processed audio signal (stretched and normalized)
+    :param out: optional float32 numpy array of the target length to write into
+    :param res_type: str, librosa resampling method
+    :return: Processed audio signal (normalized, float32) and its sample rate
     """
+    import librosa
+
     try:
         # Ensure the sample rate matches the target sample rate
         if sr != target_sample_rate:
-            audio_signal = librosa.resample(audio_signal, orig_sr=sr, target_sr=target_sample_rate)
+            audio_signal = librosa.resample(audio_signal, orig_sr=sr, target_sr=target_sample_rate, res_type=res_type)
             sr = target_sample_rate
 
-        # Normalize the audio signal
-        normalized_signal = normalize_amplitude_audio(audio_signal)
-        
-        # Adjust the length to the robust median duration (padding or truncating)
-        adjusted_signal = adjust_audio_length(normalized_signal, median_length, sr)
+        if audio_signal.size == 0:  # Check for empty signal
+            raise ValueError("Empty audio signal encountered.")
+
+        target_samples = int(median_length * sr)
+        if out is None:
+            out = np.empty(target_samples, dtype=np.float32)
+        n = min(len(audio_signal), target_samples)
+
+        # Normalize the amplitude while copying into the output buffer
+        max_amplitude = max(float(audio_signal.max()), -float(audio_signal.min()))
+        if max_amplitude > 1:
+            np.divide(audio_signal[:n], np.float32(max_amplitude), out=out[:n])
+        else:
+            out[:n] = audio_signal[:n]
 
-        
-        return adjusted_signal, sr
+        # Pad to the robust median duration (truncation happened above)
+        out[n:] = 0
+        return out, sr
 
     except Exception as e:
         print(f"Error processing audio: {e}")
         return None
 
-# Function to split audio into chunks
-def split_audio_into_chunks(y, sr, chunk_duration_ms=20, overlap_factor=0.5):
 
-    # Calculate the duration of each chunk in samples
+def chunk_start_samples(n_samples, sr, chunk_duration_ms=CHUNK_DURATION_MS, overlap_factor=OVERLAP_FACTOR):
+    """
+    Start sample of every overlapping chunk the signal is split into.
+    :param n_samples: int, length of the signal
+    :param sr: int, sample rate of the signal
+    :return: numpy array of int
+    """
+    # Calculate the duration of each chunk and the overlap in samples
     chunk_duration_samples = int((chunk_duration_ms / 1000) * sr)
-
-    # Calculate the overlap in samples
     overlap_samples = int(chunk_duration_samples * overlap_factor)
+    return np.arange(0, n_samples, chunk_duration_samples - overlap_samples)
+
+
+# Generate MFCC features from the overlapping chunks of a signal
+def generate_mfcc_features(signal, sr, n_mfcc=N_MFCC):
+    """
+    MFCCs of every chunk of the signal, equivalent to running
+    librosa.feature.mfcc on each zero-padded chunk and concatenating the
+    results along the time axis, but computed for all chunks at once.
+    :param signal: numpy array, the normalized signal
+    :param sr: int, sample rate of the signal
+    :return: numpy array of shape (n_frames, n_mfcc), float32, the model input
+    """
+    starts = chunk_start_samples(len(signal), sr)
+    if starts.size == 0:
+        raise ValueError("No chunks available for MFCC extraction.")
 
-    # List to store the audio chunks
-    chunks = []
-    start_sample = 0
+    n_frames = 1 + TARGET_CHUNK_LENGTH // MFCC_HOP_LENGTH
+    mel_power = chunk_mel_power(signal, starts, sr, out=_thread_buffer('mel_power', (len(starts), N_MELS, n_frames)))
+    return mel_power_to_mfcc(mel_power, n_mfcc=n_mfcc)
 
-    while start_sample < len(y):
-        end_sample = start_sample + chunk_duration_samples
-        chunk = y[start_sample:end_sample]
-        chunks.append(chunk)
-        start_sample = start_sample + chunk_duration_samples - overlap_samples
 
-    return chunks, sr
+# Scratch arrays reused across requests handled by the same thread
+_thread_buffers = threading.local()
 
 
-# Generate MFCC features from audio chunks
-def generate_mfcc_images(chunks, sr, target_chunk_length=882, n_mfcc=13, n_fft=128):
-    mfcc_features = []
-    for chunk in chunks :
-        # Pad or truncate the chunk to match the target length
-        if len(chunk) < target_chunk_length:
-            chunk = np.pad(chunk, (0, target_chunk_length - len(chunk)), mode='constant')
-        else:
-            chunk = chunk[:target_chunk_length]
+def _thread_buffer(name, shape):
+    """
+    Return a float32 scratch array of the given shape owned by the calling
+    thread, reusing the one from the previous request when possible.
+    """
+    buffer = getattr(_thread_buffers, name, None)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=np.float32)
+        setattr(_thread_buffers, name, buffer)
+    return buffer
 
-        # Extract MFCC features
-        mfcc = librosa.feature.mfcc(y=chunk, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft)
-        mfcc_features.append(mfcc)
 
-    # Concatenate all MFCCs along the time axis
-    if mfcc_features:
-        concatenated_mfcc = np.concatenate(mfcc_features, axis=1)  # Concatenate along the time axis
+@contextlib.contextmanager
+def timed_stage(stats, name):
+    """
+    Record the wall-clock duration of the block in stats['timings'][name].
+    :param stats: dict or None (no timing is recorded)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.setdefault('timings', {})[name] = time.perf_counter() - start
+
+
+# Stats dicts, by id, of the requests whose memory is being measured right now
+_measured_requests = {}
+_measured_requests_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def measure_peak_memory(stats):
+    """
+    Record the peak memory allocated inside the block into `stats`.
+    Uses tracemalloc when it is tracing (numpy arrays are included). Its
+    peak is process-wide and can only be reset for every request at once,
+    so 'peak_memory_mb' is recorded only for a request that ran alone.
+    Requests that overlapped with another measured one are flagged with
+    'peak_memory_concurrent' and get the process-wide resident set size
+    high-water mark, 'max_rss_mb', only, which every request records.
+    :param stats: dict, receives 'peak_memory_concurrent', 'max_rss_mb' and, alone, 'peak_memory_mb'
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        with _measured_requests_lock:
+            _measured_requests[id(stats)] = stats
+            concurrent = len(_measured_requests) > 1
+            for measured in _measured_requests.values():
+                measured['peak_memory_concurrent'] = concurrent or measured.get('peak_memory_concurrent', False)
+            baseline, _ = tracemalloc.get_traced_memory()
+            # Resetting the peak while another request is measured would erase its peak
+            if not concurrent:
+                tracemalloc.reset_peak()
+    try:
+        yield stats
+    finally:
+        if tracing:
+            with _measured_requests_lock:
+                del _measured_requests[id(stats)]
+                _, peak = tracemalloc.get_traced_memory()
+            if not stats['peak_memory_concurrent']:
+                stats['peak_memory_mb'] = max(0, peak - baseline) / 2 ** 20
+        stats['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@functools.lru_cache(maxsize=8)
+def _mel_basis(sr, n_fft, n_mels):
+    import librosa
+
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+
+def chunk_mel_power(signal, chunk_starts, sr, target_chunk_length=TARGET_CHUNK_LENGTH,
+                    n_fft=N_FFT, n_mels=N_MELS, hop_length=MFCC_HOP_LENGTH, out=None):
+    """
+    Mel power spectrogram of many chunks at once, identical to calling
+    librosa.feature.melspectrogram on each zero-padded chunk separately.
+    Samples past the end of `signal` are treated as zeros.
+    :param signal: numpy array, the audio signal the chunks are cut from
+    :param chunk_starts: numpy array of int, start sample of each chunk
+    :param sr: int, sample rate of the signal
+    :param out: optional float32 numpy array to write the result into
+    :return: numpy array of shape (n_chunks, n_mels, n_frames), float32
+    """
+    import librosa
+    import scipy.fft
+
+    chunk_starts = np.asarray(chunk_starts, dtype=np.int64)
+    n_frames = 1 + target_chunk_length // hop_length
+
+    # Offset of every sample of every centred STFT frame inside its chunk
+    offsets = (np.arange(n_frames) * hop_length - n_fft // 2)[:, None] + np.arange(n_fft)
+    indices = chunk_starts[:, None, None] + offsets
+    valid = (offsets >= 0) & (offsets < target_chunk_length) & (indices < len(signal))
+
+    if len(signal):
+        frames = np.take(signal, np.clip(indices, 0, len(signal) - 1))
     else:
-        raise ValueError("No chunks available for MFCC extraction.")
+        frames = np.zeros(indices.shape, dtype=np.float32)
+    frames = np.where(valid, frames, 0).astype(np.float32, copy=False)
+    frames *= librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+
+    spectrum = scipy.fft.rfft(frames, axis=-1)
+    power = np.square(spectrum.real)
+    power += np.square(spectrum.imag)
+    mel_basis = _mel_basis(sr, n_fft, n_mels)
+    if out is None:
+        out = np.empty((len(chunk_starts), n_mels, n_frames), dtype=np.float32)
+    np.einsum('mf,ctf->cmt', mel_basis, power, out=out, optimize=True)
+    return out
+
+
+def mel_power_to_mfcc(mel_power, n_mfcc=N_MFCC, scale=1.0, amin=1e-10, top_db=80.0):
+    """
+    MFCCs from per-chunk mel power spectra, matching librosa.feature.mfcc
+    applied to each chunk (the dB floor is relative to each chunk's peak).
+    :param mel_power: numpy array of shape (n_chunks, n_mels, n_frames)
+    :param scale: float, the signal is treated as if divided by this factor
+    :return: numpy array of shape (n_chunks * n_frames, n_mfcc), the model input
+    """
+    import scipy.fft
+
+    log_spec = np.maximum(mel_power, amin * scale ** 2)
+    np.log10(log_spec, out=log_spec)
+    log_spec *= 10.0
+    if scale != 1.0:
+        log_spec -= np.float32(20.0 * np.log10(scale))
+    np.maximum(log_spec, log_spec.max(axis=(1, 2), keepdims=True) - top_db, out=log_spec)
+    mfcc = scipy.fft.dct(log_spec, axis=1, type=2, norm='ortho')[:, :n_mfcc, :]
+
+    # Frames of consecutive chunks follow each other along the time axis
+    return mfcc.transpose(0, 2, 1).reshape(-1, n_mfcc)
 
-    return concatenated_mfcc
 
 # Run MFCC data on TFLite model for inference
-def run_inference_on_tflite_model(mfcc_data, tflite_model_path='./best_model.tflite'):
-    # Load the TFLite model
-    interpreter = tf.lite.Interpreter(model_path=tflite_model_path)
-    interpreter.allocate_tensors()
+def run_inference_on_tflite_model(mfcc_data, tflite_model_path=MODEL_PATH):
+    # Load the TFLite model (cached after the first call)
+    interpreter, lock = get_interpreter(tflite_model_path)
 
     # Get input and output tensor details
     input_details = interpreter.get_input_details()
     output_details = interpreter.get_output_details()
 
     # Prepare MFCC data for inference
-    input_data = np.expand_dims(mfcc_data, axis=0).astype(np.float32)  # Add batch dimension
+    input_data = np.ascontiguousarray(mfcc_data, dtype=np.float32)[np.newaxis]  # Add batch dimension, no copy
 
     # Run inference
-    interpreter.set_tensor(input_details[0]['index'], input_data)
-    interpreter.invoke()
+    with lock:
+        interpreter.set_tensor(input_details[0]['index'], input_data)
+        interpreter.invoke()
 
-    # Get the result
-    output_data = interpreter.get_tensor(output_details[0]['index'])
+        # Get the result
+        output_data = interpreter.get_tensor(output_details[0]['index'])
 
     # The output is the model's prediction (e.g., class probabilities)
     return output_data
 
 
-# Main pipeline function to process all audio files
-def process_audio_pipeline(file_path):
-    try:
-        # Load audio file (y = audio signal, sr = sample rate)
-        y, sr = librosa.load(file_path, sr=None)
+# Run the processing stages on an already loaded signal, up to the model input
+def extract_features(y, sr, stats=None, tier=DEFAULT_TIER, noise_profile=None):
+    """
+    The model input for a recording: the DSP front end followed by the MFCCs
+    of overlapping chunks of the normalized signal.
+    :param stats: optional dict, receives the duration of each stage in stats['timings']
+    :param tier: str, DSP quality tier, a key of PROCESSING_TIERS
+    :param noise_profile: optional NoiseProfile of the room the audio was recorded in
+    :return: numpy array of shape (n_frames, N_MFCC), float32
+    """
+    import librosa
 
-        # Step 1: Process the audio file (e.g., noise reduction and applying effects)
-        effected_audio, sr = process_audio_file(y, sr)
-        
-        # Step 2: Remove silence from the audio (using WebRTC VAD)
+    # Step 1: Process the audio file (e.g., noise reduction and applying effects)
+    with timed_stage(stats, 'denoise_effects'):
+        effected_audio, sr = process_audio_file(y, sr, tier, noise_profile)
+
+    # Step 2: Remove silence from the audio (a view, not a copy)
+    with timed_stage(stats, 'trim'):
         trimmed_audio, _ = librosa.effects.trim(effected_audio)
 
-        # Step 3: Normalize the audio and adjust its duration
-        normalised_audio, sr = normalise_audio(trimmed_audio, sr)
+    # Step 3: Normalize the audio and adjust its duration, into a reused buffer
+    with timed_stage(stats, 'normalise'):
+        target_samples = int(MEDIAN_LENGTH * TARGET_SAMPLE_RATE)
+        normalised_audio, sr = normalise_audio(trimmed_audio, sr, out=_thread_buffer('window', (target_samples,)),
+                                               res_type=PROCESSING_TIERS[tier]['res_type'])
+
+    # Step 4: Generate MFCC (Mel Frequency Cepstral Coefficients) features from overlapping audio chunks
+    with timed_stage(stats, 'mfcc'):
+        return generate_mfcc_features(normalised_audio, sr)
+
+
+# Run the processing and inference stages on an already loaded signal
+def process_audio_signal(y, sr, stats=None, tflite_model_path=MODEL_PATH, tier=DEFAULT_TIER, noise_profile=None,
+                         models=None):
+    """
+    :param stats: optional dict, receives the duration of each stage in stats['timings']
+    :param tier: str, DSP quality tier, a key of PROCESSING_TIERS
+    :param noise_profile: optional NoiseProfile of the room the audio was recorded in
+    :param models: optional ModelRegistry scoring the features instead of tflite_model_path
+    """
+    mfcc_data = extract_features(y, sr, stats, tier, noise_profile)
+
+    # Step 5: Run the MFCC data through the TFLite model for inference (classification or regression)
+    with timed_stage(stats, 'inference'):
+        if models is not None:
+            return models.predict(mfcc_data)
+        return run_inference_on_tflite_model(mfcc_data, tflite_model_path)
+
+
+def load_audio(file_path):
+    """
+    Load an audio file at its native sample rate, as float32.
+    :return: tuple (signal, sample rate)
+    """
+    import librosa
+
+    return librosa.load(file_path, sr=None, dtype=np.float32)
 
-        # Step 4: Split the audio into chunks for feature extraction
-        chunks, sr = split_audio_into_chunks(normalised_audio, sr)
 
-        # Step 5: Generate MFCC (Mel Frequency Cepstral Coefficients) features from audio chunks
-        mfcc_data = generate_mfcc_images(chunks, sr)
+def audio_duration(file_path):
+    """
+    Duration of an audio file read from its header, without decoding it.
+    :return: float, seconds, or None if the header cannot be read
+    """
+    import soundfile
 
-        # Step 6: Run the MFCC data through the TFLite model for inference (classification or regression)
-        predictions = run_inference_on_tflite_model(mfcc_data.T)
+    try:
+        return soundfile.info(file_path).duration
+    except Exception:
+        return None
+
+
+# Main pipeline function to process all audio files
+def process_audio_pipeline(file_path, stats=None, tier=DEFAULT_TIER, noise_profile=None, models=None):
+    """
+    :param stats: optional dict, receives the request's peak memory usage and stage timings
+    :param tier: str, DSP quality tier, a key of PROCESSING_TIERS
+    :param noise_profile: optional NoiseProfile of the room the audio was recorded in
+    :param models: optional ModelRegistry, the primary and shadow models to score the features with
+    """
+    try:
+        with measure_peak_memory(stats if stats is not None else {}):
+            # Load audio file (y = audio signal, sr = sample rate)
+            with timed_stage(stats, 'load'):
+                y, sr = load_audio(file_path)
+            if stats is not None:
+                stats['audio_seconds'] = len(y) / sr
+
+            predictions = process_audio_signal(y, sr, stats, tier=tier, noise_profile=noise_profile,
+                                               models=models)
         print(f"Inference for {file_path} completed, predictions: {predictions}")
 
         return(predictions)
 
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+
+
+def warm_up(duration=3.0, sr=22050, tflite_model_path=MODEL_PATH, tier=DEFAULT_TIER, stats=None):
+    """
+    Run one synthetic request through every stage of the pipeline, so that
+    model loading, numba JIT compilation and librosa's caches are paid for
+    before the first real request arrives.
+    :param duration: float, length of the synthetic signal in seconds
+    :param sr: int, sample rate of the synthetic signal; it differs from the
+               target rate so that the resampling path is exercised too
+    :param stats: optional dict, receives the duration of each stage in stats['timings']
+    :return: the model's predictions for the synthetic signal
+    """
+    t = np.arange(int(duration * sr)) / sr
+    rng = np.random.default_rng(0)
+    # Half a second of low-level noise (the noise profile) followed by a tone
+    y = 0.01 * rng.standard_normal(t.size)
+    y[int(0.5 * sr):] += 0.3 * np.sin(2 * np.pi * 220 * t[int(0.5 * sr):])
+    return process_audio_signal(y.astype(np.float32), sr, stats, tflite_model_path=tflite_model_path, tier=tier)
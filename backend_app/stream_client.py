@@ -0,0 +1,66 @@
+"""
+Reference client for the /stream-audio WebSocket endpoint.
+
+Streams a recording to the backend the way the app does while the patient
+is speaking, and reports the result together with how long it took to
+arrive after the last chunk was sent.
+
+Usage:
+    python stream_client.py recording.wav [--url ws://localhost:5000/stream-audio] [--realtime]
+"""
+import argparse
+import json
+import time
+
+import soundfile as sf
+from simple_websocket import Client
+
+
+def stream_file(file_path, url='ws://localhost:5000/stream-audio', chunk_ms=100, realtime=False):
+    """
+    Stream an audio file to the backend in chunks.
+    :param file_path: str, path to the audio file
+    :param url: str, WebSocket URL of the streaming endpoint
+    :param chunk_ms: int, duration of each chunk sent, in milliseconds
+    :param realtime: bool, pace the chunks as if they were being recorded
+    :return: tuple (response dict, seconds between the end of the stream and the response)
+    """
+    audio, sr = sf.read(file_path, dtype='int16', always_2d=True)
+    audio = audio[:, 0]
+    chunk_size = max(1, int(sr * chunk_ms / 1000))
+
+    ws = Client.connect(url)
+    try:
+        ws.send(json.dumps({'sample_rate': sr, 'format': 'int16'}))
+        for start in range(0, len(audio), chunk_size):
+            ws.send(audio[start:start + chunk_size].astype('<i2').tobytes())
+            if realtime:
+                time.sleep(chunk_ms / 1000)
+            # The server answers early once the analysis window is full
+            message = ws.receive(timeout=0)
+            if message is not None:
+                return json.loads(message), 0.0
+
+        ws.send(json.dumps({'event': 'end'}))
+        end = time.perf_counter()
+        response = json.loads(ws.receive())
+        return response, time.perf_counter() - end
+    finally:
+        ws.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', help="audio file to stream")
+    parser.add_argument('--url', default='ws://localhost:5000/stream-audio')
+    parser.add_argument('--chunk-ms', type=int, default=100)
+    parser.add_argument('--realtime', action='store_true', help="send chunks at recording speed")
+    args = parser.parse_args()
+
+    response, latency = stream_file(args.file, args.url, args.chunk_ms, args.realtime)
+    print(f"Response: {response}")
+    print(f"Result arrived {latency:.3f}s after the end of the stream")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import numpy as np
+
+from script import (
+    TARGET_SAMPLE_RATE, MEDIAN_LENGTH, TARGET_CHUNK_LENGTH, N_MELS, MFCC_HOP_LENGTH,
+    denoise_audio, get_pedalboard, chunk_start_samples, chunk_mel_power, mel_power_to_mfcc,
+    run_inference_on_tflite_model,
+)
+
+# librosa.effects.trim defaults, applied incrementally
+TRIM_TOP_DB = 60
+TRIM_FRAME_LENGTH = 2048
+TRIM_HOP_LENGTH = 512
+AMIN = 1e-10
+
+
+class _GrowingBuffer:
+    """
+    Append-only float32 buffer that grows by doubling, so appending a block
+    does not copy everything received so far.
+    """
+
+    def __init__(self, capacity):
+        self._data = np.zeros(max(int(capacity), 1), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, samples):
+        end = self._size + len(samples)
+        if end > len(self._data):
+            grown = np.zeros(max(end, 2 * len(self._data)), dtype=np.float32)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:end] = samples
+        self._size = end
+
+    def view(self, start=0, stop=None):
+        stop = self._size if stop is None else min(stop, self._size)
+        return self._data[start:stop]
+
+
+class StreamingSession:
+    """
+    Runs the audio pipeline incrementally while a recording is still being
+    captured. Each block goes through noise reduction, the Pedalboard chain
+    (whose state carries across blocks) and resampling as it arrives, and the
+    mel spectra of every complete chunk are computed straight away. When the
+    stream ends, or the analysis window is full, only the trailing chunks,
+    the cepstral step and the interpreter invocation remain.
+
+    Silence trimming and amplitude normalisation depend on the whole
+    recording, so they are tracked as the audio arrives and settled exactly
+    at the end; chunks computed against a start point that turned out to be
+    wrong are recomputed. The result matches process_audio_signal up to the
+    block boundaries of the noise reduction and the resampler: with the
+    default block and context lengths the MFCCs differ by less than 2% RMS
+    and the score by less than 2e-3 (tests/test_streaming.py).
+    """
+
+    def __init__(self, sr, block_duration=3.0, context_duration=3.0,
+                 target_sample_rate=TARGET_SAMPLE_RATE, median_length=MEDIAN_LENGTH):
+        """
+        :param sr: int, sample rate of the incoming audio
+        :param block_duration: float, seconds of audio denoised at a time
+        :param context_duration: float, seconds of audio on either side of a
+                                 block given to the noise reduction as context.
+                                 Its time smoothing runs in both directions, so
+                                 a block is only processed once this much audio
+                                 after it has arrived.
+        """
+        self.sr = int(sr)
+        if self.sr <= 0:
+            raise ValueError(f"Invalid sample rate: {sr}")
+        self.target_sample_rate = target_sample_rate
+        self.block_size = int(block_duration * self.sr)
+        self.context_size = int(context_duration * self.sr)
+
+        self._raw = _GrowingBuffer(self.block_size * 4)
+        self._processed_upto = 0  # raw samples already denoised and effected
+        self._noise_sample = None
+        self._board = get_pedalboard()
+
+        self._resampler = None
+        if self.sr != target_sample_rate:
+            import soxr
+            self._resampler = soxr.ResampleStream(self.sr, target_sample_rate, 1, dtype='float32', quality='HQ')
+
+        # Effected audio at the source rate (for trimming) and at the target rate (for features)
+        self._effected = _GrowingBuffer(self.block_size * 4)
+        self._resampled = _GrowingBuffer(int(median_length * target_sample_rate) + target_sample_rate)
+
+        # Running silence-trim state: per-frame mean square energy and its maximum
+        self._frame_mse = []
+        self._max_mse = 0.0
+        self._start_frame = 0
+
+        # Chunk layout of the analysis window and the mel spectra computed so far
+        self.window_samples = int(median_length * target_sample_rate)
+        self.chunk_starts = chunk_start_samples(self.window_samples, target_sample_rate)
+        n_frames = 1 + TARGET_CHUNK_LENGTH // MFCC_HOP_LENGTH
+        self._mel = np.zeros((len(self.chunk_starts), N_MELS, n_frames), dtype=np.float32)
+        self._chunks_done = 0
+        self._start_offset = None  # trim start at the target rate the chunks were computed for
+
+        self.finished = False
+
+    @property
+    def window_full(self):
+        """True once enough speech has arrived to fill the model's window."""
+        return self._chunks_done == len(self.chunk_starts)
+
+    def feed(self, samples):
+        """
+        Add newly captured samples and process every complete block.
+        :param samples: numpy array, mono audio at the session's sample rate
+        """
+        if self.finished:
+            return
+        self._raw.append(np.asarray(samples, dtype=np.float32))
+        while len(self._raw) - self._processed_upto >= self.block_size + self.context_size:
+            self._process_block(self._processed_upto + self.block_size)
+        self._update_features()
+
+    def finalize(self, models=None):
+        """
+        Process the remaining audio and run inference.
+        :param models: optional ModelRegistry to score the features with
+        :return: the (primary) model's predictions
+        """
+        import librosa
+
+        if not self.finished:
+            while self._processed_upto < len(self._raw):
+                self._process_block(min(self._processed_upto + self.block_size, len(self._raw)))
+            if self._resampler is not None:
+                self._resampled.append(self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+            self.finished = True
+
+        effected = self._effected.view()
+        if effected.size == 0:
+            raise ValueError("Empty audio signal encountered.")
+
+        # Settle the silence trim on the complete recording
+        _, (start, end) = librosa.effects.trim(effected, top_db=TRIM_TOP_DB,
+                                               frame_length=TRIM_FRAME_LENGTH, hop_length=TRIM_HOP_LENGTH)
+        start_offset = self._to_target_rate(start)
+        if start_offset != self._start_offset:
+            self._start_offset = start_offset
+            self._chunks_done = 0
+
+        trimmed_length = int(np.ceil((end - start) * self.target_sample_rate / self.sr))
+        trimmed = self._resampled.view(start_offset, start_offset + trimmed_length)
+        if trimmed.size == 0:
+            raise ValueError("Empty audio signal encountered.")
+
+        # Chunks that reach past the trimmed (and truncated) end are recomputed
+        window = trimmed[:self.window_samples]
+        first_partial = int(np.searchsorted(self.chunk_starts + TARGET_CHUNK_LENGTH, len(window), side='right'))
+        redo_from = min(self._chunks_done, first_partial)
+        self._mel[redo_from:] = chunk_mel_power(window, self.chunk_starts[redo_from:], self.target_sample_rate)
+        self._chunks_done = len(self.chunk_starts)
+
+        # Amplitude normalisation only rescales the mel power
+        max_amplitude = float(np.max(np.abs(trimmed)))
+        scale = max_amplitude if max_amplitude > 1 else 1.0
+        mfcc_data = mel_power_to_mfcc(self._mel, scale=scale)
+        if models is not None:
+            return models.predict(mfcc_data)
+        return run_inference_on_tflite_model(mfcc_data)
+
+    def _to_target_rate(self, sample):
+        return int(round(sample * self.target_sample_rate / self.sr))
+
+    def _process_block(self, stop):
+        start = self._processed_upto
+        raw = self._raw.view()
+        if self._noise_sample is None:
+            # First 0.5 seconds as noise profile, as in process_audio_file
+            self._noise_sample = raw[:int(self.sr * 0.5)].copy()
+
+        # Denoise with context on both sides, keep only the block itself
+        context_start = max(0, start - self.context_size)
+        context_stop = min(len(raw), stop + self.context_size)
+        reduced = denoise_audio(raw[context_start:context_stop], self.sr, self._noise_sample)
+        reduced = reduced[start - context_start:stop - context_start]
+
+        effected = self._board(reduced.astype(np.float32, copy=False), self.sr, reset=False)
+        self._effected.append(effected)
+        self._processed_upto = stop
+        self._update_trim()
+
+        if self._resampler is not None:
+            effected = self._resampler.resample_chunk(effected, last=False)
+        self._resampled.append(effected)
+
+    def _update_trim(self):
+        # Energy of every centred trim frame that is now complete
+        effected = self._effected.view()
+        half = TRIM_FRAME_LENGTH // 2
+        first = len(self._frame_mse)
+        last = (len(effected) - half) // TRIM_HOP_LENGTH
+        if last < first:
+            return
+        lo = first * TRIM_HOP_LENGTH - half
+        segment = effected[max(lo, 0):last * TRIM_HOP_LENGTH + half]
+        if lo < 0:
+            segment = np.concatenate([np.zeros(-lo, dtype=np.float32), segment])
+        windows = np.lib.stride_tricks.sliding_window_view(segment ** 2, TRIM_FRAME_LENGTH)[::TRIM_HOP_LENGTH]
+        mse = windows.mean(axis=1)
+        self._frame_mse.extend(mse.tolist())
+        self._max_mse = max(self._max_mse, float(mse.max()))
+
+        # The first non-silent frame relative to the loudest frame so far; it
+        # can only move later as louder audio arrives
+        ref_db = 10.0 * np.log10(max(AMIN, self._max_mse))
+        while self._start_frame < len(self._frame_mse) - 1:
+            db = 10.0 * np.log10(max(AMIN, self._frame_mse[self._start_frame])) - ref_db
+            if db > -TRIM_TOP_DB:
+                break
+            self._start_frame += 1
+
+    def _update_features(self):
+        if not self._frame_mse:
+            return
+        start_offset = self._to_target_rate(self._start_frame * TRIM_HOP_LENGTH)
+        if start_offset != self._start_offset:
+            # The speech onset moved, chunks computed so far are on the wrong grid
+            self._start_offset = start_offset
+            self._chunks_done = 0
+
+        # A chunk is ready once all its samples have arrived, or once the
+        # window is full (the audio is truncated there anyway)
+        available = len(self._resampled) - start_offset
+        if available >= self.window_samples:
+            ready = len(self.chunk_starts)
+        else:
+            ready = int(np.searchsorted(self.chunk_starts + TARGET_CHUNK_LENGTH, available, side='right'))
+        if ready <= self._chunks_done:
+            return
+        signal = self._resampled.view(start_offset, start_offset + self.window_samples)
+        self._mel[self._chunks_done:ready] = chunk_mel_power(
+            signal, self.chunk_starts[self._chunks_done:ready], self.target_sample_rate)
+        self._chunks_done = ready
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The backend modules live next to this directory and are imported by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FeatureCapture:
+    """Stands in for a ModelRegistry and keeps the features it is asked to score."""
+
+    def __init__(self):
+        self.features = None
+
+    def predict(self, mfcc_data):
+        self.features = mfcc_data
+        return np.zeros((1, 1), dtype=np.float32)
+
+
+def synthetic_recording(seconds, sr, seed=0, amplitude=1.0):
+    """Low-level noise with a voiced tone switching on and off, after a short silence."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.02 * rng.standard_normal(t.size)
+    voiced = (t > 0.8) & (np.sin(2 * np.pi * 1.5 * t) > 0)
+    y[voiced] += 0.4 * np.sin(2 * np.pi * 180 * t[voiced]) + 0.2 * np.sin(2 * np.pi * 360 * t[voiced])
+    return (amplitude * y).astype(np.float32)
+
+
+@pytest.fixture
+def feature_capture():
+    return FeatureCapture()
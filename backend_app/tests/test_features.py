@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+import pytest
+
+from features import FEATURE_VERSION, decode_features, encode_features, max_payload_size
+
+SHAPE = (40, 13)
+
+
+def features(shape=SHAPE):
+    return np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+
+
+def npy(array):
+    # encode_features only writes the accepted dtypes, so other payloads are built by hand
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('dtype', ['float16', 'float32'])
+def test_round_trip(dtype):
+    original = features()
+    payload = encode_features(original, dtype)
+    decoded = decode_features(payload, FEATURE_VERSION, SHAPE)
+    assert decoded.dtype == np.float32 and decoded.shape == SHAPE
+    np.testing.assert_allclose(decoded, original, rtol=1e-3, atol=1e-3)
+    assert len(payload) <= max_payload_size(SHAPE)
+
+
+def test_batch_dimension_of_one_is_dropped():
+    decoded = decode_features(encode_features(features((1,) + SHAPE)), str(FEATURE_VERSION), SHAPE)
+    assert decoded.shape == SHAPE
+
+
+@pytest.mark.parametrize('version', [FEATURE_VERSION + 1, 'v1', None])
+def test_unsupported_version_is_rejected(version):
+    with pytest.raises(ValueError, match='feature version'):
+        decode_features(encode_features(features()), version, SHAPE)
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'int16'])
+def test_unsupported_dtype_is_rejected(dtype):
+    with pytest.raises(ValueError, match='dtype'):
+        decode_features(npy(features().astype(dtype)), FEATURE_VERSION, SHAPE)
+
+
+@pytest.mark.parametrize('shape', [(41, 13), (40, 12), (2, 40, 13), (40 * 13,)])
+def test_wrong_shape_is_rejected(shape):
+    with pytest.raises(ValueError, match='shape'):
+        decode_features(encode_features(np.zeros(shape)), FEATURE_VERSION, SHAPE)
+
+
+@pytest.mark.parametrize('value', [np.nan, np.inf])
+def test_non_finite_values_are_rejected(value):
+    array = features()
+    array[3, 4] = value
+    with pytest.raises(ValueError, match='NaN or infinite'):
+        decode_features(encode_features(array), FEATURE_VERSION, SHAPE)
+
+
+@pytest.mark.parametrize('payload', [b'', b'not a numpy file', encode_features(features())[:200]])
+def test_malformed_payload_is_rejected(payload):
+    with pytest.raises(ValueError):
+        decode_features(payload, FEATURE_VERSION, SHAPE)
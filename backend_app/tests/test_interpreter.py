@@ -0,0 +1,45 @@
+import pytest
+
+import script
+
+
+class WorkingInterpreter:
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+
+    def allocate_tensors(self):
+        pass
+
+
+def broken_interpreter(error):
+    class BrokenInterpreter(WorkingInterpreter):
+        def __init__(self, model_path, num_threads=None):
+            raise error
+    return BrokenInterpreter
+
+
+def runtimes(*interpreter_factories):
+    return tuple((f"runtime{i}", factory) for i, factory in enumerate(interpreter_factories))
+
+
+@pytest.mark.parametrize('error', [RuntimeError("Flex ops"), ValueError("bad model"),
+                                   AttributeError("_ARRAY_API not found")])
+def test_falls_back_when_the_slim_runtime_cannot_run_the_model(monkeypatch, error):
+    monkeypatch.setattr(script, '_INTERPRETER_RUNTIMES',
+                        runtimes(lambda: broken_interpreter(error), lambda: WorkingInterpreter))
+    assert isinstance(script.load_tflite_interpreter('model.tflite'), WorkingInterpreter)
+
+
+def test_falls_back_when_the_slim_runtime_cannot_be_imported(monkeypatch):
+    def incompatible_wheel():
+        raise AttributeError("_ARRAY_API not found")
+    monkeypatch.setattr(script, '_INTERPRETER_RUNTIMES', runtimes(incompatible_wheel, lambda: WorkingInterpreter))
+    assert isinstance(script.load_tflite_interpreter('model.tflite'), WorkingInterpreter)
+
+
+def test_last_error_is_raised_when_no_runtime_can_run_the_model(monkeypatch):
+    monkeypatch.setattr(script, '_INTERPRETER_RUNTIMES',
+                        runtimes(lambda: broken_interpreter(AttributeError("first")),
+                                 lambda: broken_interpreter(RuntimeError("second"))))
+    with pytest.raises(RuntimeError, match='second'):
+        script.load_tflite_interpreter('model.tflite')
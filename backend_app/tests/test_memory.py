@@ -0,0 +1,46 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from script import measure_peak_memory
+
+MB = 2 ** 20
+
+
+@pytest.fixture
+def tracing():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def allocate(megabytes):
+    return np.ones(megabytes * MB, dtype=np.uint8)
+
+
+def test_request_alone_reports_its_peak(tracing):
+    stats = {}
+    with measure_peak_memory(stats):
+        allocate(20)
+    assert not stats['peak_memory_concurrent']
+    assert stats['peak_memory_mb'] == pytest.approx(20, abs=1)
+    assert stats['max_rss_mb'] > 0
+
+
+def test_overlapping_requests_report_no_peak(tracing):
+    first, second = {}, {}
+    with measure_peak_memory(first):
+        # The first request's peak is over before the second starts, and must not be lost or under-reported
+        allocate(50)
+        with measure_peak_memory(second):
+            allocate(10)
+    for stats in (first, second):
+        assert stats['peak_memory_concurrent']
+        assert 'peak_memory_mb' not in stats
+        assert stats['max_rss_mb'] > 0
+
+    alone = {}
+    with measure_peak_memory(alone):
+        pass
+    assert not alone['peak_memory_concurrent'] and alone['peak_memory_mb'] < 1
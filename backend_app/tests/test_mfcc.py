@@ -0,0 +1,64 @@
+import librosa
+import numpy as np
+import pytest
+
+from script import (TARGET_CHUNK_LENGTH, N_MFCC, N_FFT, chunk_mel_power, chunk_start_samples,
+                    generate_mfcc_features, mel_power_to_mfcc)
+
+SR = 44100
+
+
+def reference_mfcc(signal, sr, chunk_duration_ms=20, overlap_factor=0.5):
+    """
+    The original per-chunk path, as in preprocessin/audios_to_mfcc.py: split
+    into overlapping chunks, zero-pad each to TARGET_CHUNK_LENGTH, run
+    librosa.feature.mfcc on it and concatenate along the time axis.
+    """
+    chunk_samples = int(chunk_duration_ms / 1000 * sr)
+    step = chunk_samples - int(chunk_samples * overlap_factor)
+    mfccs = []
+    for start in range(0, len(signal), step):
+        chunk = signal[start:start + chunk_samples]
+        chunk = np.pad(chunk, (0, max(0, TARGET_CHUNK_LENGTH - len(chunk))))[:TARGET_CHUNK_LENGTH]
+        mfccs.append(librosa.feature.mfcc(y=chunk, sr=sr, n_mfcc=N_MFCC, n_fft=N_FFT))
+    return np.concatenate(mfccs, axis=1).T
+
+
+def speech_like(n, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / SR
+    y = 0.05 * rng.standard_normal(n) + 0.5 * np.sin(2 * np.pi * 150 * t) * (np.sin(2 * np.pi * 3 * t) > 0)
+    return y.astype(np.float32)
+
+
+def assert_mfcc_close(actual, expected):
+    assert actual.shape == expected.shape
+    # The dB floor and the DCT run in float32 here and float64 in librosa
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=5e-3)
+
+
+@pytest.mark.parametrize('n_samples', [
+    441 * 40,        # the last chunks reach past the end of the signal
+    441 * 40 + 100,  # the last chunk is shorter than the chunk step
+    500,             # a single chunk shorter than the chunk length
+])
+def test_generate_mfcc_features_matches_librosa_per_chunk(n_samples):
+    signal = speech_like(n_samples)
+    assert_mfcc_close(generate_mfcc_features(signal, SR), reference_mfcc(signal, SR))
+
+
+def test_silent_chunks_match_librosa():
+    # Chunks of zeros hit the amin floor of the dB conversion
+    signal = speech_like(441 * 20)
+    signal[441 * 5:441 * 12] = 0
+    assert_mfcc_close(generate_mfcc_features(signal, SR), reference_mfcc(signal, SR))
+
+
+@pytest.mark.parametrize('scale', [1.7, 40.0])
+def test_scaled_mel_power_matches_librosa_on_the_scaled_signal(scale):
+    # A signal that clips is divided by its peak before the MFCCs are taken;
+    # the streaming path applies that division to the mel power instead
+    signal = scale * speech_like(441 * 30)
+    mel_power = chunk_mel_power(signal, chunk_start_samples(len(signal), SR), SR)
+    expected = reference_mfcc((signal / scale).astype(np.float32), SR)
+    assert_mfcc_close(mel_power_to_mfcc(mel_power, scale=scale), expected)
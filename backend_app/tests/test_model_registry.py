@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry, parse_models
+
+
+def test_parse_models():
+    assert parse_models('') == {}
+    assert parse_models('retrain-a=/models/a.tflite, /models/b.tflite ,') == {
+        'retrain-a': '/models/a.tflite', 'b': '/models/b.tflite'}
+
+
+def test_parse_models_rejects_duplicate_names():
+    with pytest.raises(ValueError, match='Duplicate model name: a'):
+        parse_models('a=/models/a.tflite,/other/a.tflite')
+
+
+def test_shadow_named_like_the_primary_is_rejected():
+    with pytest.raises(ValueError, match='clashes with the primary'):
+        ModelRegistry(primary='/models/best.tflite', shadows='best=/models/other.tflite')
+
+
+def test_shadow_requests_beyond_max_pending_are_dropped(monkeypatch):
+    release = threading.Event()
+    shadow_calls = []
+
+    def run_inference(mfcc_data, model_path):
+        if model_path != '/models/primary.tflite':
+            shadow_calls.append(model_path)
+            release.wait(10)
+        return np.array([[0.9]])
+
+    monkeypatch.setattr(model_registry, 'run_inference_on_tflite_model', run_inference)
+    registry = ModelRegistry(primary='/models/primary.tflite', shadows='candidate=/models/candidate.tflite',
+                             max_pending=2, log_path=None)
+    features = np.zeros((4, 13), dtype=np.float32)
+    # The shadow thread blocks on the first request, so two are pending and the rest are dropped
+    for _ in range(5):
+        assert registry.predict(features)[0][0] == pytest.approx(0.9)
+    summary = registry.summary()
+    assert summary['shadow_pending'] == 2 and summary['shadow_dropped'] == 3
+
+    release.set()
+    registry._executor.shutdown(wait=True)
+    summary = registry.summary()
+    assert summary['shadow_pending'] == 0 and summary['shadow_dropped'] == 3
+    assert shadow_calls == ['/models/candidate.tflite'] * 2
+    assert summary['models']['primary']['latency']['count'] == 5
+    assert summary['models']['candidate']['label_agreement'] == 1.0
@@ -0,0 +1,111 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import script
+from noise_profiles import NoiseProfile, NoiseProfileStore, spectral_gate
+
+
+def profile(level, sr=16000):
+    return NoiseProfile(np.full(513, level, dtype=np.float32), np.ones(513, dtype=np.float32), sr)
+
+
+def test_profile_rebuilt_by_another_process_is_reloaded(tmp_path):
+    worker, other_worker = NoiseProfileStore(str(tmp_path)), NoiseProfileStore(str(tmp_path))
+    worker.save('room-1', profile(-60.0))
+    assert other_worker.get('room-1').mean_db[0] == -60.0
+
+    worker.save('room-1', profile(-40.0))
+    assert other_worker.get('room-1').mean_db[0] == -40.0
+
+
+def test_deleted_profile_is_forgotten(tmp_path):
+    store = NoiseProfileStore(str(tmp_path))
+    store.save('room-1', profile(-60.0))
+    assert store.get('room-1') is not None
+    (tmp_path / 'room-1.npz').unlink()
+    assert store.get('room-1') is None
+    assert store.list() == []
+
+
+def test_concurrent_saves_of_one_id_leave_a_whole_profile(tmp_path, monkeypatch):
+    # Two request threads build the same id, their writes interleaved
+    barrier = threading.Barrier(2)
+    write = NoiseProfile.save
+
+    def interleaved_save(self, f):
+        buffer = io.BytesIO()
+        write(self, buffer)
+        data = buffer.getvalue()
+        f.write(data[:len(data) // 2])
+        barrier.wait()
+        f.write(data[len(data) // 2:])
+        f.flush()
+        barrier.wait()
+
+    monkeypatch.setattr(NoiseProfile, 'save', interleaved_save)
+    store = NoiseProfileStore(str(tmp_path))
+    errors = []
+
+    def save(level):
+        try:
+            store.save('room-1', profile(level))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(level,)) for level in (-60.0, -40.0)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert NoiseProfileStore(str(tmp_path)).get('room-1').mean_db[0] in (-60.0, -40.0)
+    assert os.listdir(tmp_path) == ['room-1.npz']
+
+
+SR = 16000
+
+
+def noise(seconds, seed):
+    return 0.05 * np.random.default_rng(seed).standard_normal(int(seconds * SR)).astype(np.float32)
+
+
+@pytest.fixture
+def room_profile():
+    return NoiseProfile.from_noise(noise(3, seed=0), SR)
+
+
+@pytest.mark.parametrize('prop_decrease', [0.9, 0.5])
+def test_gate_attenuates_noise_by_prop_decrease(room_profile, prop_decrease):
+    # With a threshold far above the noise, every bin is gated
+    y = noise(2, seed=1)
+    gated = spectral_gate(y, SR, room_profile, prop_decrease=prop_decrease, n_std_thresh=10)
+    assert len(gated) == len(y)
+    assert rms(gated) / rms(y) == pytest.approx(1 - prop_decrease, rel=0.02)
+
+
+def test_gate_keeps_the_signal_and_removes_most_noise(room_profile):
+    y = noise(2, seed=2)
+    t = np.arange(len(y)) / SR
+    tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    assert len(spectral_gate(y, SR, room_profile)) == len(y)
+    assert rms(spectral_gate(y, SR, room_profile)) < 0.3 * rms(y)
+    assert rms(spectral_gate(tone + y, SR, room_profile)) == pytest.approx(rms(tone), rel=0.02)
+
+
+@pytest.mark.parametrize('tier, gated', [('full', True), ('fast', True), ('minimal', False)])
+def test_process_audio_file_gates_against_the_profile(monkeypatch, room_profile, tier, gated):
+    calls = []
+    monkeypatch.setattr(script, 'spectral_gate', lambda y, sr, p: calls.append(p) or y)
+    monkeypatch.setattr(script, 'denoise_audio', lambda *args: pytest.fail("noise estimated from the upload"))
+    y = noise(1, seed=3)
+    effected, sr = script.process_audio_file(y, SR, tier, room_profile)
+    assert calls == ([room_profile] if gated else [])
+    assert sr == SR and len(effected) == len(y)
+
+
+def rms(y):
+    return float(np.sqrt(np.mean(np.square(y))))
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import profiling
+from profiling import RequestProfiler
+
+
+def profiler(tmp_path, **settings):
+    return RequestProfiler(directory=str(tmp_path), **settings)
+
+
+def test_requested_kind_wins(tmp_path):
+    assert profiler(tmp_path).choose('sampling') == 'sampling'
+    with pytest.raises(ValueError, match='Unknown profiler kind'):
+        profiler(tmp_path).choose('perf')
+
+
+def test_armed_requests_are_profiled_once_each(tmp_path):
+    request_profiler = profiler(tmp_path)
+    request_profiler.configure(profile_next=2, kind='sampling')
+    assert [request_profiler.choose() for _ in range(3)] == ['sampling', 'sampling', None]
+    assert request_profiler.profile_next == 0
+
+
+def test_sampling_rate(tmp_path, monkeypatch):
+    assert profiler(tmp_path, sample_rate=0.0).choose() is None
+    assert profiler(tmp_path, sample_rate=1.0).choose() == 'cprofile'
+    monkeypatch.setattr(profiling.random, 'random', lambda: 0.3)
+    assert profiler(tmp_path, sample_rate=0.25).choose() is None
+    assert profiler(tmp_path, sample_rate=0.5).choose() == 'cprofile'
+
+
+@pytest.mark.parametrize('settings', [{'sample_rate': 1.5}, {'sample_rate': -0.1}, {'kind': 'perf'}])
+def test_invalid_settings_are_rejected(tmp_path, settings):
+    with pytest.raises(ValueError):
+        profiler(tmp_path).configure(**settings)
+
+
+def write_profiles(tmp_path, count):
+    names = [f"20240101-00000{i}-process-audio-100ms-abc.prof" for i in range(count)]
+    for age, name in enumerate(reversed(names)):
+        path = tmp_path / name
+        path.write_text('')
+        os.utime(path, (1000 - age, 1000 - age))
+    return names
+
+
+def test_rotation_keeps_the_newest_profiles(tmp_path):
+    names = write_profiles(tmp_path, 5)
+    (tmp_path / 'notes.txt').write_text('')
+    request_profiler = profiler(tmp_path, max_files=3)
+    request_profiler._rotate()
+    assert [p['name'] for p in request_profiler.list_profiles()] == names[:1:-1]
+    assert (tmp_path / 'notes.txt').exists()
+
+
+def test_profiles_deleted_while_listing_are_skipped(tmp_path, monkeypatch):
+    names = write_profiles(tmp_path, 3)
+    stat = os.stat
+
+    def deleted_by_another_worker(path, *args, **kwargs):
+        if path.endswith(names[1]):
+            raise FileNotFoundError(path)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(profiling.os, 'stat', deleted_by_another_worker)
+    request_profiler = profiler(tmp_path, max_files=1)
+    assert [p['name'] for p in request_profiler.list_profiles()] == [names[2], names[0]]
+    request_profiler._rotate()
+    monkeypatch.undo()
+    assert [p['name'] for p in request_profiler.list_profiles()] == [names[2], names[1]]
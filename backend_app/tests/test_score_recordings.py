@@ -0,0 +1,44 @@
+import pytest
+
+from score_recordings import COLUMNS, CsvResultWriter, ParquetResultWriter
+
+
+def row(path, score=None, error=None):
+    values = dict.fromkeys(COLUMNS)
+    values.update(path=path, score=score, label=None if score is None else int(score > 0.8), error=error,
+                  total_s=1.0)
+    return values
+
+
+@pytest.fixture(params=['csv', 'parquet'])
+def writer_setup(request, tmp_path):
+    if request.param == 'parquet':
+        pytest.importorskip('pyarrow')
+        return ParquetResultWriter, str(tmp_path / 'results.parquet')
+    return CsvResultWriter, str(tmp_path / 'results.csv')
+
+
+def test_failed_recordings_are_retried_on_resume(writer_setup):
+    writer_class, path = writer_setup
+    writer = writer_class(path)
+    writer.write(row('a.wav', score=0.9))
+    writer.write(row('b.wav', error='ValueError: Empty audio signal encountered.'))
+    writer.close()
+
+    assert writer_class.completed(path) == {'a.wav'}
+
+
+def test_parquet_keeps_finished_row_groups_when_killed(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'results.parquet')
+    writer = ParquetResultWriter(path, row_group_size=2)
+    for name in ('a.wav', 'b.wav', 'c.wav'):
+        writer.write(row(name, score=0.5))
+    # No close(): the run is killed with c.wav still buffered
+
+    assert ParquetResultWriter.completed(path) == {'a.wav', 'b.wav'}
+
+    resumed = ParquetResultWriter(path, row_group_size=2)
+    resumed.write(row('c.wav', score=0.5))
+    resumed.close()
+    assert ParquetResultWriter.completed(path) == {'a.wav', 'b.wav', 'c.wav'}
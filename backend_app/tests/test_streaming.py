@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from conftest import FeatureCapture, synthetic_recording
+from script import process_audio_signal
+from streaming import StreamingSession
+
+# Streaming denoises and resamples block by block, so its MFCCs differ from
+# the batch pipeline's near block boundaries. These bounds are the ones
+# documented on StreamingSession.
+MAX_RELATIVE_RMS = 0.02
+MAX_SCORE_DELTA = 2e-3
+
+
+def stream(y, sr, models, chunk_seconds=0.1):
+    session = StreamingSession(sr)
+    chunk = int(chunk_seconds * sr)
+    for start in range(0, len(y), chunk):
+        session.feed(y[start:start + chunk])
+        if session.window_full:
+            break
+    return session.finalize(models)
+
+
+def relative_rms(actual, expected):
+    return float(np.sqrt(np.mean((actual - expected) ** 2) / np.mean(expected ** 2)))
+
+
+@pytest.mark.parametrize('sr, seconds, amplitude', [
+    (16000, 12, 1.0),
+    (22050, 8, 3.0),   # clips, so the normalisation rescales the signal
+    (44100, 70, 1.0),  # longer than the analysis window, answered early
+])
+def test_streaming_features_match_batch(sr, seconds, amplitude):
+    y = synthetic_recording(seconds, sr, amplitude=amplitude)
+    batch, streamed = FeatureCapture(), FeatureCapture()
+    process_audio_signal(y, sr, models=batch)
+    stream(y, sr, streamed)
+
+    assert streamed.features.shape == batch.features.shape
+    assert relative_rms(streamed.features, batch.features) < MAX_RELATIVE_RMS
+
+
+def test_streaming_score_matches_batch():
+    y = synthetic_recording(12, 16000)
+    batch_score = float(process_audio_signal(y, 16000)[0][0])
+    streamed_score = float(stream(y, 16000, None)[0][0])
+    assert abs(streamed_score - batch_score) < MAX_SCORE_DELTA
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tiers import TierSelector
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timings(fixed, per_second, audio_seconds):
+    # Split like a real request: inference is fixed, denoising grows with the audio
+    return {'load': 0.0, 'denoise_effects': per_second * audio_seconds, 'trim': 0.0, 'inference': fixed}
+
+
+def test_estimate_scales_with_the_recording_length():
+    selector = TierSelector()
+    selector.observe('full', timings(fixed=4.0, per_second=0.05, audio_seconds=10), 10)
+    assert selector.expected_seconds('full', 10) == pytest.approx(4.5)
+    assert selector.expected_seconds('full', 60) == pytest.approx(7.0)
+
+
+def test_latency_budget_picks_the_best_tier_that_fits_the_upload():
+    selector = TierSelector()
+    selector.observe('full', timings(fixed=4.0, per_second=0.05, audio_seconds=10), 10)
+    selector.observe('fast', timings(fixed=4.0, per_second=0.02, audio_seconds=10), 10)
+    selector.observe('minimal', timings(fixed=4.0, per_second=0.001, audio_seconds=10), 10)
+
+    assert selector.select(latency_budget=5.0, audio_seconds=10) == ('full', 'latency budget')
+    assert selector.select(latency_budget=5.0, audio_seconds=40) == ('fast', 'latency budget')
+    assert selector.select(latency_budget=5.0, audio_seconds=120) == ('minimal', 'latency budget')
+
+
+def test_estimates_are_running_averages():
+    selector = TierSelector(smoothing=0.5)
+    selector.observe('full', timings(fixed=4.0, per_second=0.1, audio_seconds=10), 10)
+    selector.observe('full', timings(fixed=2.0, per_second=0.3, audio_seconds=20), 20)
+    assert selector.estimates['full'] == pytest.approx({'fixed': 3.0, 'per_second': 0.2})
+
+
+@pytest.mark.parametrize('request_threads, fast, minimal', [(1, 2, 3), (2, 2, 3), (4, 3, 4), (8, 5, 8)])
+def test_queue_depths_follow_the_request_threads(request_threads, fast, minimal):
+    # A worker never has more than REQUEST_THREADS requests in flight, so the defaults must stay within it
+    code = "import tiers; print(tiers.FAST_TIER_QUEUE_DEPTH, tiers.MINIMAL_TIER_QUEUE_DEPTH)"
+    env = {name: value for name, value in os.environ.items() if not name.endswith('_TIER_QUEUE_DEPTH')}
+    env['REQUEST_THREADS'] = str(request_threads)
+    output = subprocess.run([sys.executable, '-c', code], env=env, cwd=BACKEND_DIR, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.split() == [str(fast), str(minimal)]
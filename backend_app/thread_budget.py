@@ -0,0 +1,163 @@
+"""
+One CPU thread budget for every thread pool in a worker process.
+
+TFLite, the TensorFlow runtime behind the model's Flex ops, BLAS (NumPy and
+SciPy), OpenMP and numba each size their thread pools to the whole machine
+by default, so several workers in one container oversubscribe its CPUs and
+tail latency suffers. Here a worker gets THREADS_PER_WORKER cores; when it
+is not set it is derived from WORKERS and the CPUs the container may use
+(its affinity, capped by the cgroup CPU quota). A serving worker runs up to
+REQUEST_THREADS requests at once, plus the thread scoring shadow models
+when SHADOW_MODELS is set (see model_registry.py), so those cores are split
+between them and every pool is sized to THREADS_PER_REQUEST. Pedalboard and
+soxr run on the calling thread and need no setting.
+
+The native pools read their sizes from the environment when they are first
+loaded, so this module has to be imported before numpy: every entry point
+that loads numpy (script.py, app.py and the batch scripts) imports it
+first, and gunicorn.conf.py imports it in the master before the app is
+loaded. Process pools that split the CPUs differently call limit_threads.
+
+Settings (environment variables):
+    WORKERS             worker processes per container (default: CPUs / THREADS_PER_WORKER, or 1)
+    THREADS_PER_WORKER  cores per worker (default: CPUs / WORKERS)
+    REQUEST_THREADS     requests a worker runs at once (default: 1; gunicorn.conf.py serves with 4)
+    CPU_LIMIT           CPUs to budget for (default: detected)
+    THREAD_BUDGET=0     leave every pool at its library default
+"""
+import math
+import os
+import sys
+
+# Environment variables read by the native thread pools when they are loaded
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                   'NUMEXPR_NUM_THREADS', 'NUMBA_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')
+
+
+def _read_cgroup_file(path):
+    with open(path) as f:
+        return f.read().split()
+
+
+def cgroup_cpu_quota():
+    """
+    :return: float, CPUs allowed by the cgroup CPU quota, or None if unlimited
+    """
+    try:
+        quota, period = _read_cgroup_file('/sys/fs/cgroup/cpu.max')  # cgroup v2
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(_read_cgroup_file('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')[0])  # cgroup v1
+        period = int(_read_cgroup_file('/sys/fs/cgroup/cpu/cpu.cfs_period_us')[0])
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def container_cpus():
+    """
+    CPUs this process may use: its CPU affinity, capped by the container's
+    CPU quota (rounded down, a fractional CPU is not enough for a thread).
+    :return: int, at least 1
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.floor(quota))
+    return max(1, cpus)
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def plan(cpus, workers=None, threads_per_worker=None):
+    """
+    Split the CPUs between worker processes and their threads. Whichever of
+    the two settings is missing is derived from the other; with neither, a
+    single worker gets every CPU.
+    :return: tuple (workers, threads_per_worker)
+    """
+    if threads_per_worker:
+        return workers or max(1, cpus // threads_per_worker), threads_per_worker
+    workers = workers or 1
+    return workers, max(1, cpus // workers)
+
+
+ENABLED = os.environ.get('THREAD_BUDGET', '1') != '0'
+CPU_LIMIT = _env_int('CPU_LIMIT') or container_cpus()
+WORKERS, THREADS_PER_WORKER = plan(CPU_LIMIT, _env_int('WORKERS'), _env_int('THREADS_PER_WORKER'))
+REQUEST_THREADS = _env_int('REQUEST_THREADS') or 1
+# The shadow models are scored on one background thread next to the requests
+SHADOW_THREADS = 1 if os.environ.get('SHADOW_MODELS', '').strip() else 0
+
+
+def _threads_per_request(threads_per_worker):
+    return max(1, threads_per_worker // (REQUEST_THREADS + SHADOW_THREADS))
+
+
+THREADS_PER_REQUEST = _threads_per_request(THREADS_PER_WORKER)
+
+
+def _set_env(threads):
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+
+
+def pool_plan(workers=None):
+    """
+    Workers and threads per worker for a batch process pool. A given number
+    of workers splits the CPUs between them; otherwise THREADS_PER_WORKER
+    sets the split if it was configured, else every CPU gets a
+    single-threaded worker, which gives the best throughput.
+    :return: tuple (workers, threads_per_worker)
+    """
+    threads = _env_int('THREADS_PER_WORKER') if not workers else None
+    return plan(CPU_LIMIT, workers, threads or (None if workers else 1))
+
+
+def limit_threads(threads):
+    """
+    Resize the thread pools of a running process, e.g. a pool worker that
+    splits the CPUs differently from its parent. Such a worker processes one
+    recording at a time and scores no shadow models, so its pools get every
+    thread. BLAS and OpenMP pools are resized with threadpoolctl when it is
+    installed; TFLite interpreters and the TensorFlow runtime pick up the
+    new size when they are loaded next.
+    """
+    global THREADS_PER_WORKER, THREADS_PER_REQUEST
+    if not ENABLED:
+        return
+    THREADS_PER_WORKER = THREADS_PER_REQUEST = threads
+    _set_env(THREADS_PER_REQUEST)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(THREADS_PER_REQUEST)
+    except ImportError:
+        pass
+    if 'numba' in sys.modules:
+        import numba
+        numba.set_num_threads(min(THREADS_PER_REQUEST, numba.config.NUMBA_NUM_THREADS))
+
+
+def tflite_num_threads():
+    """
+    :return: int or None, num_threads for TFLite interpreters (None keeps the default)
+    """
+    return THREADS_PER_REQUEST if ENABLED else None
+
+
+def settings():
+    return {'enabled': ENABLED, 'cpus': CPU_LIMIT, 'cgroup_quota': cgroup_cpu_quota(), 'workers': WORKERS,
+            'threads_per_worker': THREADS_PER_WORKER, 'request_threads': REQUEST_THREADS,
+            'shadow_threads': SHADOW_THREADS, 'threads_per_request': THREADS_PER_REQUEST}
+
+
+if ENABLED:
+    _set_env(THREADS_PER_REQUEST)
@@ -0,0 +1,115 @@
+import contextlib
+import os
+import threading
+
+import thread_budget
+from script import PROCESSING_TIERS, DEFAULT_TIER, MEDIAN_LENGTH
+
+# Tiers from the highest to the lowest quality
+TIER_ORDER = ('full', 'fast', 'minimal')
+
+# Requests in flight in this worker (including the new one) at which the
+# server degrades to each tier. A worker never has more than REQUEST_THREADS
+# in flight, and with all of them busy new requests queue in the listen
+# backlog, so by default the server degrades to fast once more than half the
+# request threads are busy and to minimal once all of them are (with three
+# or more threads). A worker serving one request at a time never degrades on
+# queue depth.
+FAST_TIER_QUEUE_DEPTH = int(os.environ.get('FAST_TIER_QUEUE_DEPTH', max(2, thread_budget.REQUEST_THREADS // 2 + 1)))
+MINIMAL_TIER_QUEUE_DEPTH = int(os.environ.get('MINIMAL_TIER_QUEUE_DEPTH',
+                                              max(FAST_TIER_QUEUE_DEPTH + 1, thread_budget.REQUEST_THREADS)))
+
+# Stages whose cost grows with the length of the recording; the others run on
+# the fixed-length analysis window and cost the same for every recording
+PER_SECOND_STAGES = ('load', 'denoise_effects', 'trim')
+
+
+class TierSelector:
+    """
+    Picks the DSP quality tier for each request. A tier requested by the
+    client wins; otherwise a latency budget picks the best tier expected to
+    fit it; otherwise the tier degrades as more requests are in flight.
+    A tier's expected latency is a fixed cost plus a cost per second of
+    audio, both running averages over the stage timings of past requests,
+    so it scales with the length of each upload.
+    """
+
+    def __init__(self, fast_queue_depth=FAST_TIER_QUEUE_DEPTH, minimal_queue_depth=MINIMAL_TIER_QUEUE_DEPTH,
+                 smoothing=0.2):
+        """
+        :param smoothing: float, weight of the newest observation in the running averages
+        """
+        self.fast_queue_depth = fast_queue_depth
+        self.minimal_queue_depth = minimal_queue_depth
+        self.smoothing = smoothing
+        self.estimates = {}  # tier -> {'fixed': seconds, 'per_second': seconds per second of audio}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track_request(self):
+        """Count a request as in flight for the duration of the block; yields the queue depth."""
+        with self._lock:
+            self._in_flight += 1
+            depth = self._in_flight
+        try:
+            yield depth
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def observe(self, tier, timings, audio_seconds):
+        """
+        Fold the stage timings of a finished request into the tier's estimate.
+        :param timings: dict, stage -> seconds, as recorded in stats['timings']
+        :param audio_seconds: float, duration of the recording processed
+        """
+        if audio_seconds <= 0:
+            return
+        observed = {
+            'fixed': sum(seconds for stage, seconds in timings.items() if stage not in PER_SECOND_STAGES),
+            'per_second': sum(timings.get(stage, 0.0) for stage in PER_SECOND_STAGES) / audio_seconds,
+        }
+        with self._lock:
+            previous = self.estimates.get(tier)
+            if previous is None:
+                self.estimates[tier] = observed
+            else:
+                self.estimates[tier] = {key: (1 - self.smoothing) * previous[key] + self.smoothing * value
+                                        for key, value in observed.items()}
+
+    def expected_seconds(self, tier, audio_seconds):
+        """
+        :return: float, expected processing time of a recording of this length, or None without an estimate
+        """
+        estimate = self.estimates.get(tier)
+        if estimate is None:
+            return None
+        return estimate['fixed'] + estimate['per_second'] * audio_seconds
+
+    def select(self, requested=None, latency_budget=None, queue_depth=1, audio_seconds=MEDIAN_LENGTH):
+        """
+        :param requested: str or None, tier asked for by the client
+        :param latency_budget: float or None, seconds the client is willing to wait
+        :param queue_depth: int, requests in flight including this one
+        :param audio_seconds: float, duration of the uploaded recording
+        :return: tuple (tier, reason)
+        """
+        if requested:
+            if requested not in PROCESSING_TIERS:
+                raise ValueError(f"Unknown processing tier: {requested}")
+            return requested, 'requested'
+
+        if latency_budget is not None:
+            # Requests in flight share the CPU, so each takes proportionally longer
+            for tier in TIER_ORDER:
+                estimate = self.expected_seconds(tier, audio_seconds)
+                if estimate is not None and estimate * queue_depth <= latency_budget:
+                    return tier, 'latency budget'
+            return TIER_ORDER[-1], 'latency budget'
+
+        if queue_depth >= self.minimal_queue_depth:
+            return 'minimal', 'queue depth'
+        if queue_depth >= self.fast_queue_depth:
+            return 'fast', 'queue depth'
+        return DEFAULT_TIER, 'default'